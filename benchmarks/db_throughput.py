@@ -0,0 +1,80 @@
+# benchmarks/db_throughput.py
+"""Compare per-call SQLite connections with the shared connection pool.
+
+Simulates text lookups (one indexed SELECT per update) issued concurrently
+from the event loop and reports updates/sec for both access patterns.
+
+    python -m benchmarks.db_throughput --rows 20000 --updates 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from drive_bot.database import ConnectionPool, init_db
+
+LOOKUP_SQL = 'SELECT telegram_file_id, share_link FROM images WHERE title = ?'
+
+
+def seed(db_path: str, rows: int):
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO images (title, telegram_file_id, drive_file_id, share_link) '
+        'VALUES (?, ?, ?, ?)',
+        ((f"title {n}", f"tg{n}", f"drive{n}", f"https://drive/{n}") for n in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+async def per_call(db_path: str, titles):
+    """The old pattern: connect, set PRAGMAs, query and close on the loop"""
+    async def lookup(title):
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(LOOKUP_SQL, (title,)).fetchone()
+        conn.commit()
+        conn.close()
+    await asyncio.gather(*(lookup(t) for t in titles))
+
+
+async def pooled(db_path: str, titles):
+    pool = ConnectionPool(db_path)
+
+    def lookup(title, conn):
+        return conn.execute(LOOKUP_SQL, (title,)).fetchone()
+
+    try:
+        await asyncio.gather(*(pool.run(lookup, t, readonly=True) for t in titles))
+    finally:
+        pool.close()
+
+
+def measure(name: str, coro_factory, updates: int):
+    start = time.perf_counter()
+    asyncio.run(coro_factory())
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {updates / elapsed:>10.0f} updates/sec ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--updates', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, args.rows)
+        titles = [f"title {random.randrange(args.rows)}" for _ in range(args.updates)]
+        measure('per-call', lambda: per_call(db_path, titles), args.updates)
+        measure('pooled', lambda: pooled(db_path, titles), args.updates)
+
+
+if __name__ == '__main__':
+    main()
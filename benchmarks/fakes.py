@@ -0,0 +1,274 @@
+# benchmarks/fakes.py
+"""In-process stand-ins for the Bot API and Google Drive.
+
+Both follow the interfaces the bot already talks to, so the real handlers
+run unchanged: ``FakeTelegramRequest`` is a python-telegram-bot request
+backend, and ``FakeDrive`` mimics the parts of the Drive v3 client used by
+drive_bot. Each call sleeps for a configurable latency and fails with a
+configurable probability.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httplib2
+from googleapiclient.errors import HttpError
+from telegram import Bot
+from telegram.request import BaseRequest, RequestData
+
+
+@dataclass
+class Injection:
+    """Latency (seconds, with exponential jitter) and error rate of a fake"""
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+
+    def delay(self) -> float:
+        return self.latency + (random.expovariate(1 / self.jitter) if self.jitter else 0.0)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Answers Bot API calls locally with plausible payloads"""
+
+    def __init__(self, injection: Injection, file_path: str, file_size: int):
+        self.injection = injection
+        self.file_path = file_path
+        self.file_size = file_size
+        self.calls: Dict[str, int] = {}
+        self._message_ids = itertools.count(1000)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data else {}
+
+        delay = self.injection.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.injection.should_fail():
+            return 500, json.dumps({
+                'ok': False, 'error_code': 500, 'description': 'Injected failure'
+            }).encode()
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, params)}).encode()
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = params.get('chat_id', 1)
+        message = {
+            'message_id': params.get('message_id') or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+        for field in ('text', 'caption'):
+            if field in params:
+                message[field] = params[field]
+        return message
+
+    def _result(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        if endpoint == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'GoDrive', 'username': 'godrive_bot'}
+        if endpoint == 'getFile':
+            return {
+                'file_id': params.get('file_id', ''),
+                'file_unique_id': 'bench',
+                'file_size': self.file_size,
+                'file_path': self.file_path,
+            }
+        if endpoint == 'sendMediaGroup':
+            media = params.get('media', [])
+            if isinstance(media, str):
+                media = json.loads(media)
+            return [self._message(params) for _ in media]
+        if endpoint.startswith(('send', 'edit')):
+            if 'inline_message_id' in params:
+                return True
+            return self._message(params)
+        return True
+
+
+def fake_bot(token: str, injection: Injection, file_path: str, file_size: int) -> Bot:
+    """A Bot whose requests never leave the process.
+
+    Local mode makes file downloads copy ``file_path`` instead of fetching
+    it over HTTP.
+    """
+    request = FakeTelegramRequest(injection, file_path, file_size)
+    return Bot(token, request=request, get_updates_request=request, local_mode=True)
+
+
+class FakeDriveRequest:
+    """One Drive call; mirrors HttpRequest.execute/next_chunk"""
+
+    def __init__(self, drive: 'FakeDrive', method_id: str, respond: Callable[[], Any]):
+        self.drive = drive
+        self.methodId = method_id
+        self._respond = respond
+
+    def execute(self, http=None, num_retries: int = 0):
+        self.drive.pause()
+        return self.drive.complete(self)
+
+    def next_chunk(self, http=None, num_retries: int = 0):
+        return None, self.execute(http)
+
+
+class _Resource:
+    def __init__(self, drive: 'FakeDrive', name: str):
+        self._drive = drive
+        self._name = name
+
+    def __getattr__(self, method: str):
+        handler = getattr(self._drive, f"_{self._name}_{method}")
+
+        def build(**kwargs):
+            return FakeDriveRequest(
+                self._drive, f"drive.{self._name}.{method}", lambda: handler(**kwargs))
+        return build
+
+
+class FakeBatch:
+    """Mirrors BatchHttpRequest: one round-trip, per-call results"""
+
+    def __init__(self, drive: 'FakeDrive', callback: Callable):
+        self.drive = drive
+        self.callback = callback
+        self.requests: Dict[str, FakeDriveRequest] = {}
+
+    def add(self, request: FakeDriveRequest, request_id: Optional[str] = None):
+        self.requests[request_id or str(len(self.requests))] = request
+
+    def execute(self, http=None):
+        self.drive.pause()
+        for request_id, request in self.requests.items():
+            try:
+                self.callback(request_id, self.drive.complete(request), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeDrive:
+    """Thread-safe in-memory Drive with files, permissions and a changes feed.
+
+    Calls run on the bot's Drive executor threads, so latency is a real
+    blocking sleep just like an HTTP round-trip.
+    """
+
+    def __init__(self, injection: Injection):
+        self.injection = injection
+        self.files_by_id: Dict[str, Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {}
+        # Changes feed; a page token is an index into this list
+        self.changes_log: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def pause(self):
+        delay = self.injection.delay()
+        if delay:
+            time.sleep(delay)
+
+    def complete(self, request: FakeDriveRequest):
+        with self._lock:
+            self.calls[request.methodId] = self.calls.get(request.methodId, 0) + 1
+        if self.injection.should_fail():
+            raise HttpError(httplib2.Response({'status': 503}), b'{"error": "injected"}')
+        return request._respond()
+
+    def files(self) -> _Resource:
+        return _Resource(self, 'files')
+
+    def permissions(self) -> _Resource:
+        return _Resource(self, 'permissions')
+
+    def changes(self) -> _Resource:
+        return _Resource(self, 'changes')
+
+    def new_batch_http_request(self, callback: Callable) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    def _record_change(self, file_id: str, removed: bool = False):
+        # Called with the lock held
+        change = {'fileId': file_id, 'removed': removed}
+        if not removed:
+            change['file'] = dict(self.files_by_id[file_id])
+        self.changes_log.append(change)
+
+    def _not_found(self, file_id: str) -> HttpError:
+        return HttpError(httplib2.Response({'status': 404}), f'File {file_id} not found'.encode())
+
+    def _files_create(self, body: Dict, media_body=None, **kwargs):
+        content = media_body.getbytes(0, media_body.size()) if media_body else b''
+        with self._lock:
+            file_id = f"fake{next(self._ids)}"
+            self.files_by_id[file_id] = dict(
+                body, id=file_id, md5Checksum=hashlib.md5(content).hexdigest())
+            self._record_change(file_id)
+        return {
+            'id': file_id,
+            'name': body.get('name'),
+            'webViewLink': f"https://drive.google.com/file/d/{file_id}/view",
+            'webContentLink': f"https://drive.google.com/uc?id={file_id}",
+        }
+
+    def _files_list(self, **kwargs):
+        return {'files': []}
+
+    def _files_get(self, fileId: str, **kwargs):
+        with self._lock:
+            if fileId not in self.files_by_id:
+                raise self._not_found(fileId)
+            return dict(self.files_by_id[fileId])
+
+    def _files_update(self, fileId: str, body: Dict, **kwargs):
+        with self._lock:
+            if fileId not in self.files_by_id:
+                raise self._not_found(fileId)
+            self.files_by_id[fileId].update(body)
+            self._record_change(fileId)
+            return {'id': fileId}
+
+    def _files_delete(self, fileId: str, **kwargs):
+        with self._lock:
+            if self.files_by_id.pop(fileId, None) is None:
+                raise self._not_found(fileId)
+            self._record_change(fileId, removed=True)
+        return ''
+
+    def _changes_getStartPageToken(self, **kwargs):
+        with self._lock:
+            return {'startPageToken': str(len(self.changes_log))}
+
+    def _changes_list(self, pageToken: str, pageSize: int = 100, **kwargs):
+        start = int(pageToken)
+        with self._lock:
+            page = self.changes_log[start:start + pageSize]
+            end = start + len(page)
+            response = {'changes': page}
+            if end < len(self.changes_log):
+                response['nextPageToken'] = str(end)
+            else:
+                response['newStartPageToken'] = str(end)
+            return response
+
+    def _permissions_create(self, fileId: str, body: Dict, **kwargs):
+        return {'id': 'anyoneWithLink', 'role': body.get('role'), 'type': body.get('type')}
+
+
+__all__ = ['Injection', 'FakeTelegramRequest', 'fake_bot', 'FakeDrive', 'FakeDriveRequest']
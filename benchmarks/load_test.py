@@ -0,0 +1,347 @@
+# benchmarks/load_test.py
+"""Replay a synthetic update stream through the real handlers.
+
+Text lookups, inline queries, link button callbacks, uploads and deletes
+are fed to an Application built with main.register_handlers, backed by a
+temporary database, a fake Bot API and a fake Drive (benchmarks.fakes).
+Reports p50/p95/p99 latency and throughput per handler, appends the run
+to a history file tagged with the git revision, and compares it with the
+previous run of the same configuration. The query plan audit
+(benchmarks.query_plan) runs first and a failing audit stops the run.
+
+    python -m benchmarks.load_test --updates 5000 --concurrency 32
+    python -m benchmarks.load_test --drive-latency 0.2 --drive-errors 0.05
+    python -m benchmarks.load_test --seed-from requests.jsonl
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ContextTypes
+
+from benchmarks.fakes import FakeDrive, Injection, fake_bot
+from benchmarks.query_plan import run_audit
+
+BENCH_TOKEN = '123456:benchmark'
+DEFAULT_MIX = 'text=55,inline=25,callback=12,upload=5,delete=3'
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), 'load_test_history.jsonl')
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = int(weight)
+    unknown = set(mix) - set(UPDATE_BUILDERS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown update kinds: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def seed_titles(rows: int, seed_from: Optional[str]) -> List[str]:
+    """Realistic titles from a JSONL file's 'title' fields, topped up synthetically"""
+    titles = []
+    if seed_from:
+        with open(seed_from, encoding='utf-8') as source:
+            for line in source:
+                if not line.strip():
+                    continue
+                raw = json.loads(line).get('title', '')
+                # Keep to the characters /upload accepts
+                title = re.sub(r'[^\w \-.,]', '', raw).strip()[:100]
+                if title and title not in titles:
+                    titles.append(title)
+    titles.extend(f"image {n}" for n in range(max(0, rows - len(titles))))
+    return titles
+
+
+def seed_database(db_path: str, titles: List[str], drive: FakeDrive):
+    from drive_bot.database import init_db
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO images (title, telegram_file_id, drive_file_id, share_link) '
+        'VALUES (?, ?, ?, ?)',
+        ((title, f"tg{n}", f"seed{n}", f"https://drive/{n}") for n, title in enumerate(titles))
+    )
+    conn.commit()
+    conn.close()
+    for n, title in enumerate(titles):
+        drive.files_by_id[f"seed{n}"] = {'id': f"seed{n}", 'name': title}
+
+
+class Workload:
+    """Builds Bot API update payloads; ids and titles stay consistent"""
+
+    def __init__(self, titles: List[str], admin_id: int, users: int):
+        self.titles = titles
+        self.live = list(range(len(titles)))
+        self.admin_id = admin_id
+        self.users = users
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.uploads = itertools.count(1)
+
+    def _user(self, user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+
+    def _message(self, user_id: int, **fields) -> Dict:
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+        }
+        message.update(fields)
+        return message
+
+    def _random_user(self) -> int:
+        return 10_000 + random.randrange(self.users)
+
+    def _title_index(self) -> int:
+        return random.choice(self.live)
+
+    def text(self) -> Dict:
+        # One in ten lookups misses, like a mistyped title
+        title = self.titles[self._title_index()] if random.random() > 0.1 else 'no such image'
+        return {'message': self._message(self._random_user(), text=title)}
+
+    def inline(self) -> Dict:
+        title = self.titles[self._title_index()]
+        query = title[:random.randint(3, max(3, len(title)))]
+        return {'inline_query': {
+            'id': str(next(self.update_ids)), 'from': self._user(self._random_user()),
+            'query': query, 'offset': '',
+        }}
+
+    def callback(self) -> Dict:
+        from drive_bot.handlers.button_handler import encode_link
+        user_id = self._random_user()
+        # Row ids start at 1 in insertion order
+        image_id = self._title_index() + 1
+        return {'callback_query': {
+            'id': str(next(self.update_ids)), 'from': self._user(user_id),
+            'chat_instance': 'bench', 'data': encode_link(image_id),
+            'message': self._message(user_id, caption='📌 bench', photo=[{
+                'file_id': 'tg', 'file_unique_id': 'tg', 'width': 1, 'height': 1}]),
+        }}
+
+    def upload(self) -> Dict:
+        n = next(self.uploads)
+        return {'message': self._message(self.admin_id, caption=f"bench upload {n}", photo=[{
+            'file_id': f"upload{n}", 'file_unique_id': f"upload{n}",
+            'width': 640, 'height': 480, 'file_size': 1024}])}
+
+    def delete(self) -> Dict:
+        index = self._title_index()
+        if len(self.live) > 1:
+            self.live.remove(index)
+        text = f"/delete {self.titles[index]}"
+        return {'message': self._message(
+            self.admin_id, text=text,
+            entities=[{'type': 'bot_command', 'offset': 0, 'length': len('/delete')}])}
+
+
+UPDATE_BUILDERS = {
+    'text': Workload.text,
+    'inline': Workload.inline,
+    'callback': Workload.callback,
+    'upload': Workload.upload,
+    'delete': Workload.delete,
+}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def replay(app, workload: Workload, mix: Dict[str, int], updates: int,
+                 concurrency: int) -> Dict[str, Dict]:
+    kinds = random.choices(list(mix), weights=list(mix.values()), k=updates)
+    latencies: Dict[str, List[float]] = {kind: [] for kind in mix}
+    errors = {kind: 0 for kind in mix}
+    failed = set()
+
+    async def count_error(update: object, context: ContextTypes.DEFAULT_TYPE):
+        failed.add(id(update))
+    app.add_error_handler(count_error)
+
+    queue = iter(kinds)
+
+    async def worker():
+        for kind in queue:
+            payload = UPDATE_BUILDERS[kind](workload)
+            payload['update_id'] = next(workload.update_ids)
+            update = Update.de_json(payload, app.bot)
+            started = time.perf_counter()
+            await app.process_update(update)
+            latencies[kind].append(time.perf_counter() - started)
+            if id(update) in failed:
+                # Ids are reused once an update is freed
+                failed.discard(id(update))
+                errors[kind] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for kind, samples in latencies.items():
+        if not samples:
+            continue
+        results[kind] = {
+            'count': len(samples),
+            'errors': errors[kind],
+            'throughput': len(samples) / elapsed,
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p95_ms': percentile(samples, 95) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+        }
+    results['total'] = {'count': updates, 'elapsed_s': elapsed, 'throughput': updates / elapsed}
+    return results
+
+
+def git_revision() -> str:
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd=repo).returncode != 0
+        return f"{rev}-dirty" if dirty else rev
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def previous_run(history: str, config: Dict) -> Optional[Dict]:
+    if not os.path.exists(history):
+        return None
+    previous = None
+    with open(history, encoding='utf-8') as runs:
+        for line in runs:
+            entry = json.loads(line)
+            if entry.get('config') == config:
+                previous = entry
+    return previous
+
+
+def report(results: Dict[str, Dict], previous: Optional[Dict]):
+    print(f"{'handler':<10} {'count':>7} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  p95 vs last")
+    for kind, stats in results.items():
+        if kind == 'total':
+            continue
+        change = ''
+        before = (previous or {}).get('results', {}).get(kind)
+        if before and before['p95_ms']:
+            change = f"{(stats['p95_ms'] / before['p95_ms'] - 1):+.0%} ({previous['rev']})"
+        print(f"{kind:<10} {stats['count']:>7} {stats['errors']:>7} {stats['throughput']:>9.1f} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}  {change}")
+    total = results['total']
+    print(f"\n{total['count']} updates in {total['elapsed_s']:.2f}s "
+          f"({total['throughput']:.0f} updates/sec)")
+
+
+async def run(args, db_path: str, spool_file: str):
+    # Imported late: the bot's modules read their configuration on import
+    import drive_bot.drive_service as drive_service
+    from drive_bot.config import ADMIN_ID
+    from drive_bot.database import access_tracker, pool
+    from drive_bot.handlers.inline_handler import inline_coalescer
+    from drive_bot.upload_queue import upload_queue
+    from drive_bot.bot import register_handlers
+
+    drive = FakeDrive(Injection(args.drive_latency, args.drive_latency / 2, args.drive_errors))
+    titles = seed_titles(args.rows, args.seed_from)
+    seed_database(db_path, titles, drive)
+    pool.db_path = db_path
+    drive_service._service = drive
+    drive_service._thread_http = lambda: None
+    inline_coalescer.debounce = args.inline_debounce
+
+    bot = fake_bot(BENCH_TOKEN, Injection(args.telegram_latency, args.telegram_latency / 2,
+                                          args.telegram_errors),
+                   spool_file, os.path.getsize(spool_file))
+    app = (ApplicationBuilder().bot(bot).updater(None)
+           .concurrent_updates(args.concurrency).build())
+    register_handlers(app)
+
+    await app.initialize()
+    try:
+        workload = Workload(titles, ADMIN_ID, args.users)
+        results = await replay(app, workload, parse_mix(args.mix), args.updates, args.concurrency)
+        drain_started = time.perf_counter()
+        await upload_queue.shutdown()
+        results['total']['upload_drain_s'] = time.perf_counter() - drain_started
+        results['total']['drive_calls'] = dict(drive.calls)
+        results['total']['telegram_calls'] = dict(bot.request.calls)
+    finally:
+        await app.shutdown()
+        await access_tracker.stop()
+        pool.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rows', type=int, default=5000, help='images seeded before the run')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weights per update kind')
+    parser.add_argument('--seed-from', help='JSONL file whose "title" fields seed titles')
+    parser.add_argument('--drive-latency', type=float, default=0.05)
+    parser.add_argument('--drive-errors', type=float, default=0.0)
+    parser.add_argument('--telegram-latency', type=float, default=0.02)
+    parser.add_argument('--telegram-errors', type=float, default=0.0)
+    parser.add_argument('--inline-debounce', type=float, default=0.0)
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    parser.add_argument('--no-history', action='store_true')
+    args = parser.parse_args()
+    parse_mix(args.mix)
+    random.seed(args.random_seed)
+
+    failed = [statement for statement in run_audit()[0] if statement.problems]
+    if failed:
+        sys.exit(f"Query plan audit failed for {len(failed)} statements; "
+                 f"see python -m benchmarks.query_plan")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool_file = os.path.join(tmp, 'photo.jpg')
+        with open(spool_file, 'wb') as photo:
+            photo.write(os.urandom(64 * 1024))
+        results = asyncio.run(run(args, os.path.join(tmp, 'bench.db'), spool_file))
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ('history', 'no_history')}
+    previous = None if args.no_history else previous_run(args.history, config)
+    report(results, previous)
+    if not args.no_history:
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'rev': git_revision(),
+            'config': config,
+            'results': results,
+        }
+        with open(args.history, 'a', encoding='utf-8') as history:
+            history.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# benchmarks/query_plan.py
+"""Check the query plan of every SQL statement in drive_bot/.
+
+Statements passed to execute/executemany are found with the ast module
+(string literals, f-strings and module-level string constants) and run
+through EXPLAIN QUERY PLAN against a freshly migrated, empty database,
+which plans like production: the bot never runs ANALYZE. The audit fails
+when a statement scans a table or an index instead of searching it,
+unless the scan is listed in ALLOWED_SCANS with its reason, and when a
+hot lookup is not answered from a covering index alone.
+
+Migrations are not audited: they run once and batch their scans by id.
+
+    python -m benchmarks.query_plan
+    python -m benchmarks.query_plan --verbose
+"""
+import argparse
+import ast
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PACKAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'drive_bot')
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.IGNORECASE)
+EXECUTE_METHODS = ('execute', 'executemany')
+
+# Values for the dynamic parts of f-string SQL, keyed by the interpolated
+# expression. Module constants and IN lists built from '?' * len(...) need
+# no entry.
+SUBSTITUTIONS: Dict[str, Tuple[str, ...]] = {
+    'column': ('file_unique_id', 'content_md5'),
+    'assignments': ('state = ?', 'state = ?, drive_file_id = ?'),
+}
+
+# Scans that are intended, keyed by (function, a fragment of the SQL)
+ALLOWED_SCANS: Dict[Tuple[str, str], str] = {
+    ('get_stats', 'COUNT(*)'): "/stats aggregates every active image",
+    ('list_images', 'LIMIT ?'): "first page reads the covering index in order up to LIMIT",
+    ('unfinished_upload_jobs', 'INDEXED BY'): "the partial index holds only jobs in flight",
+    ('_search', 'WHERE title LIKE ?'): "substring LIKE fallback when FTS5 is unavailable",
+}
+
+# Hot lookups that must be answered from an index without reading the table
+COVERING_REQUIRED = ('get_image_by_title', 'get_images_by_titles', 'list_images')
+
+
+@dataclass
+class Statement:
+    path: str
+    line: int
+    function: str
+    sql: str
+    plan: List[str] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+
+    @property
+    def where(self) -> str:
+        return f"{os.path.relpath(self.path)}:{self.line} {self.function}"
+
+
+def _render(node: ast.AST, constants: Dict[str, str]) -> Optional[List[str]]:
+    """Every SQL text an argument can take, or None if it is not SQL-like"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, ast.Name) and node.id in constants:
+        return [constants[node.id]]
+    if not isinstance(node, ast.JoinedStr):
+        return None
+    texts = ['']
+    for part in node.values:
+        if isinstance(part, ast.Constant):
+            texts = [text + part.value for text in texts]
+            continue
+        source = ast.unparse(part.value)
+        if source in constants:
+            values: Tuple[str, ...] = (constants[source],)
+        elif "'?' * len(" in source:
+            values = ('?, ?',)
+        elif source in SUBSTITUTIONS:
+            values = SUBSTITUTIONS[source]
+        else:
+            raise ValueError(f"no substitution for {{{source}}}")
+        texts = [text + value for text in texts for value in values]
+    return texts
+
+
+def find_statements(package: str = PACKAGE) -> Iterator[Statement]:
+    for root, dirs, files in os.walk(package):
+        dirs[:] = sorted(d for d in dirs if d not in ('__pycache__', 'migrations'))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                yield from _scan_file(os.path.join(root, name))
+
+
+def _scan_file(path: str) -> Iterator[Statement]:
+    with open(path, encoding='utf-8') as source:
+        tree = ast.parse(source.read(), path)
+    constants = {
+        target.id: node.value.value
+        for node in tree.body if isinstance(node, ast.Assign)
+        and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        for target in node.targets if isinstance(target, ast.Name)
+    }
+    functions = [node for node in ast.walk(tree)
+                 if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in EXECUTE_METHODS and node.args):
+            continue
+        function = next((f.name for f in functions
+                         if f.lineno <= node.lineno <= f.end_lineno), '<module>')
+        try:
+            texts = _render(node.args[0], constants)
+        except ValueError as e:
+            statement = Statement(path, node.lineno, function, ast.unparse(node.args[0]))
+            statement.problems.append(f"unresolved dynamic SQL: {e}")
+            yield statement
+            continue
+        for text in texts or ():
+            if SQL_START.match(text):
+                yield Statement(path, node.lineno, function, ' '.join(text.split()))
+
+
+def migrated_database(db_path: str) -> sqlite3.Connection:
+    from drive_bot.migrations import migrate
+    logging.getLogger('drive_bot.migrations').setLevel(logging.WARNING)
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    return conn
+
+
+def audit(conn: sqlite3.Connection, statements: List[Statement]) -> List[Statement]:
+    tables = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for statement in statements:
+        if statement.problems:
+            continue
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {statement.sql}",
+                                [None] * statement.sql.count('?')).fetchall()
+        except sqlite3.Error as e:
+            statement.problems.append(f"cannot plan: {e}")
+            continue
+        statement.plan = [row[-1] for row in rows]
+        allowed = any(function == statement.function and fragment in statement.sql
+                      for function, fragment in ALLOWED_SCANS)
+        for detail in statement.plan:
+            # FTS lookups show up as a SCAN of the virtual table
+            match = re.match(r'SCAN (\w+)(?!.* VIRTUAL TABLE)', detail)
+            if not allowed and match and match.group(1) in tables:
+                statement.problems.append(f"scan: {detail}")
+        if statement.function in COVERING_REQUIRED and statement.sql.startswith('SELECT') \
+                and not any('COVERING INDEX' in detail for detail in statement.plan):
+            statement.problems.append("hot lookup reads the table; expected a covering index")
+    return statements
+
+
+def unused_indexes(conn: sqlite3.Connection, statements: List[Statement]) -> List[str]:
+    """Indexes no audited plan uses (UNIQUE constraint indexes excluded)"""
+    used = {index for statement in statements for detail in statement.plan
+            for index in re.findall(r'INDEX (\w+)', detail)}
+    return [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name")
+        if name not in used]
+
+
+def run_audit() -> Tuple[List[Statement], List[str]]:
+    """Audited statements and the indexes none of them uses"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_database(os.path.join(tmp, 'plan.db'))
+        try:
+            statements = audit(conn, list(find_statements()))
+            return statements, unused_indexes(conn, statements)
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    statements, unused = run_audit()
+    failed = [statement for statement in statements if statement.problems]
+    for statement in statements:
+        if args.verbose or statement.problems:
+            print(f"{statement.where}\n    {statement.sql}")
+            for detail in statement.plan:
+                print(f"    plan: {detail}")
+            for problem in statement.problems:
+                print(f"    FAIL: {problem}")
+    if unused:
+        print(f"Indexes no statement uses: {', '.join(unused)}")
+    print(f"{len(statements)} statements audited, {len(failed)} with problems")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
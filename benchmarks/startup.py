@@ -0,0 +1,59 @@
+# benchmarks/startup.py
+"""Cold-start cost: importing the bot and answering the first lookup.
+
+Each run happens in a fresh interpreter against a fresh database in a
+temporary directory, so the configured DB_PATH is never touched. 'lazy' is
+the current behaviour, where the Drive client is built on first upload.
+'eager' builds it during startup the way the module used to at import time.
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = '''
+import asyncio, time
+t0 = time.perf_counter()
+import main
+from drive_bot.database import find_image, init_db, pool
+from drive_bot.drive_service import get_drive_service
+t1 = time.perf_counter()
+init_db()
+if {eager}:
+    get_drive_service()
+asyncio.run(find_image('startup benchmark'))
+t3 = time.perf_counter()
+pool.close()
+print(t1 - t0, t3 - t0)
+'''
+
+
+def run(eager: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_PATH=os.path.join(tmp, 'startup.db'))
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD.format(eager=eager)],
+            capture_output=True, text=True, check=True, env=env
+        ).stdout.strip().splitlines()[-1]
+    return [float(value) for value in output.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'import (ms)':>12} {'first update (ms)':>18}")
+    for mode, eager in (('eager', True), ('lazy', False)):
+        samples = [run(eager) for _ in range(args.runs)]
+        imports = statistics.median(s[0] for s in samples) * 1000
+        first = statistics.median(s[1] for s in samples) * 1000
+        print(f"{mode:<6} {imports:>12.0f} {first:>18.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/upload_memory.py
+"""Peak RSS of the Telegram -> Drive transfer path for growing file sizes.
+
+Each measurement runs in a fresh interpreter: a local HTTP server plays the
+Telegram file endpoint, the file is downloaded and then read back chunk by
+chunk exactly as a resumable Drive upload would.
+
+    python -m benchmarks.upload_memory --sizes 1 5 20
+"""
+import argparse
+import asyncio
+import resource
+import subprocess
+import sys
+from io import BytesIO
+
+from aiohttp import web
+from googleapiclient.http import MediaIoBaseUpload
+
+from drive_bot.transfer import UPLOAD_CHUNK_SIZE, download_to_path, drive_media, spool_path
+from drive_bot.utils import safe_delete_file
+
+PAYLOAD_BLOCK = b'\0' * (64 * 1024)
+
+
+class _LocalFile:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+
+class _LocalBot:
+    """Just enough of telegram.Bot for download_to_path"""
+    local_mode = False
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def get_file(self, file_id: str):
+        return _LocalFile(self.url)
+
+
+async def _serve(size: int) -> web.AppRunner:
+    async def handler(request):
+        response = web.StreamResponse(headers={'Content-Length': str(size)})
+        await response.prepare(request)
+        sent = 0
+        while sent < size:
+            block = PAYLOAD_BLOCK[:size - sent]
+            await response.write(block)
+            sent += len(block)
+        return response
+
+    app = web.Application()
+    app.router.add_get('/file', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 8765).start()
+    return runner
+
+
+def _drain(media):
+    """Read the upload the way googleapiclient's next_chunk does"""
+    offset = 0
+    while offset < media.size():
+        chunk = media.getbytes(offset, media.chunksize())
+        offset += len(chunk)
+
+
+async def _transfer(mode: str, size: int):
+    runner = await _serve(size)
+    bot = _LocalBot('http://127.0.0.1:8765/file')
+    try:
+        if mode == 'streaming':
+            path = spool_path('.bin')
+            await download_to_path(bot, 'bench', path)
+            _drain(drive_media(path, 'application/octet-stream'))
+            await safe_delete_file(path)
+        else:
+            # The old path: whole file in a BytesIO, then a MediaIoBaseUpload
+            import httpx
+            async with httpx.AsyncClient() as client:
+                buffer = BytesIO((await client.get(bot.url)).content)
+            _drain(MediaIoBaseUpload(buffer, mimetype='application/octet-stream',
+                                     chunksize=UPLOAD_CHUNK_SIZE, resumable=True))
+    finally:
+        await runner.cleanup()
+
+
+def _child(mode: str, megabytes: int):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    asyncio.run(_transfer(mode, megabytes * 1024 * 1024))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{(peak - baseline) / 1024:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 10, 20],
+                        help='file sizes in MB')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child[0], int(args.child[1]))
+        return
+
+    print(f"{'size':>6} {'buffered':>12} {'streaming':>12}   (peak RSS growth, MB)")
+    for megabytes in args.sizes:
+        row = []
+        for mode in ('buffered', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.upload_memory',
+                 '--child', mode, str(megabytes)],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            row.append(float(output))
+        print(f"{megabytes:>4}MB {row[0]:>12.1f} {row[1]:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
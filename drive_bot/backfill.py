@@ -0,0 +1,75 @@
+# drive_bot/backfill.py
+import os
+import asyncio
+import logging
+from typing import Optional
+from drive_bot.database import images_missing_hash, set_content_hashes
+from drive_bot.drive_service import execute_batch, get_drive_service
+
+logger = logging.getLogger(__name__)
+
+HASH_BACKFILL_BATCH_SIZE = int(os.environ.get('BACKFILL_BATCH_SIZE', 100))
+# Pause between batches so the backfill never crowds out live traffic
+HASH_BACKFILL_PAUSE = float(os.environ.get('BACKFILL_PAUSE', 1.0))
+
+_task: Optional[asyncio.Task] = None
+
+
+async def backfill_content_hashes(batch_size: int = HASH_BACKFILL_BATCH_SIZE) -> int:
+    """Fill content_md5 for images stored before deduplication.
+
+    Drive already knows every binary file's MD5 (md5Checksum), so nothing
+    is downloaded: each batch of images costs one batch metadata request
+    and one UPDATE transaction. Returns the number of Drive files hashed.
+    """
+    after_id = 0
+    hashed = 0
+    while True:
+        rows = await images_missing_hash(limit=batch_size, after_id=after_id)
+        if rows is None:
+            raise ConnectionError("Database unavailable during hash backfill")
+        if not rows:
+            return hashed
+        after_id = rows[-1]['id']
+
+        file_ids = {row['drive_file_id'] for row in rows}
+        results = await execute_batch({
+            file_id: get_drive_service().files().get(
+                fileId=file_id, fields='id,md5Checksum', supportsAllDrives=True)
+            for file_id in file_ids
+        })
+        hashes = []
+        for file_id, (response, error) in results.items():
+            if error is not None:
+                logger.warning(f"No checksum for Drive file {file_id}: {error}")
+            elif response.get('md5Checksum'):
+                hashes.append((response['md5Checksum'], file_id))
+        if hashes:
+            await set_content_hashes(hashes)
+            hashed += len(hashes)
+        logger.info(f"Hash backfill: {hashed} files hashed, up to image {after_id}")
+        await asyncio.sleep(HASH_BACKFILL_PAUSE)
+
+
+def start_backfill(on_done=None) -> bool:
+    """Run the backfill in the background; False if one is already running"""
+    global _task
+    if _task is not None and not _task.done():
+        return False
+
+    async def run():
+        try:
+            hashed = await backfill_content_hashes()
+            logger.info(f"Hash backfill finished: {hashed} files hashed")
+            if on_done:
+                await on_done(hashed, None)
+        except Exception as e:
+            logger.exception("Hash backfill failed")
+            if on_done:
+                await on_done(None, e)
+
+    _task = asyncio.create_task(run())
+    return True
+
+
+__all__ = ['backfill_content_hashes', 'start_backfill']
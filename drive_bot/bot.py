@@ -0,0 +1,84 @@
+# drive_bot/bot.py
+"""Handler registration and lifecycle hooks shared by every way of running
+the bot: polling, single-process webhook and the cluster workers."""
+import os
+import logging
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    MessageHandler,
+    CallbackQueryHandler,
+    filters,
+    InlineQueryHandler
+)
+from drive_bot.handlers.start_handler import start
+from drive_bot.handlers.upload_handler import upload_image
+from drive_bot.handlers.delete_handler import delete_image
+from drive_bot.handlers.text_handler import handle_text
+from drive_bot.handlers.button_handler import button_callback
+from drive_bot.handlers.inline_handler import inline_query
+from drive_bot.handlers.stats_handler import stats
+from drive_bot.handlers.bulk_handler import bulk_start, bulk_done, receive_media
+from drive_bot.handlers.list_handler import list_command, list_callback, CALLBACK_PREFIX
+from drive_bot.handlers.backfill_handler import backfill_hashes
+from drive_bot.database import pool, access_tracker, migration_backfills
+from drive_bot.upload_queue import upload_queue
+from drive_bot.jobs import resume_upload_jobs, stop_upload_jobs
+from drive_bot.metrics import instrument
+from drive_bot.reconcile import reconciler
+from drive_bot.web import web_server
+
+logger = logging.getLogger(__name__)
+
+# Updates a cluster worker handles at once, across chats. A single process
+# handles updates one at a time, which keeps each chat's messages, /bulk
+# and /done in order; only inline queries run alongside
+CONCURRENT_UPDATES = int(os.environ.get('CONCURRENT_UPDATES', 16))
+
+async def post_init(app: Application):
+    """Pick up uploads interrupted by the last restart"""
+    await web_server.start()
+    await resume_upload_jobs(app.bot)
+    reconciler.start()
+    migration_backfills.start()
+
+async def post_stop(app: Application):
+    """Let queued uploads finish before the process exits"""
+    await stop_upload_jobs()
+    await upload_queue.shutdown()
+    # Jobs that failed while the queue drained may have scheduled retries
+    await stop_upload_jobs()
+    await access_tracker.stop()
+    await reconciler.stop()
+    await migration_backfills.stop()
+    await web_server.stop()
+    pool.close()
+
+def register_handlers(app: Application):
+    """Register every update handler, each wrapped with metrics"""
+    # Command handlers
+    app.add_handler(CommandHandler("start", instrument("start")(start)))
+    app.add_handler(CommandHandler("upload", instrument("upload")(upload_image)))
+    app.add_handler(CommandHandler("delete", instrument("delete")(delete_image)))
+    app.add_handler(CommandHandler("stats", instrument("stats")(stats)))
+    app.add_handler(CommandHandler("bulk", instrument("bulk")(bulk_start)))
+    app.add_handler(CommandHandler("done", instrument("done")(bulk_done)))
+    app.add_handler(CommandHandler("list", instrument("list")(list_command)))
+    app.add_handler(CommandHandler("backfill_hashes", instrument("backfill")(backfill_hashes)))
+
+    # Message handlers
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrument("text")(handle_text)))
+    app.add_handler(CallbackQueryHandler(instrument("list_page")(list_callback), pattern=f"^{CALLBACK_PREFIX}"))
+    app.add_handler(CallbackQueryHandler(instrument("callback")(button_callback), pattern=r"^(l:|link_)"))
+    # Non-blocking: the debounce waits for newer keystrokes, which must be
+    # able to arrive meanwhile, and inline answers need no ordering
+    app.add_handler(InlineQueryHandler(instrument("inline")(inline_query), block=False))
+    
+    # Photo and document handler (single files, albums and /bulk sessions)
+    app.add_handler(MessageHandler(
+        (filters.PHOTO | filters.Document.ALL) & ~filters.COMMAND, 
+        instrument("media")(receive_media)
+    ))
+
+
+__all__ = ['CONCURRENT_UPDATES', 'post_init', 'post_stop', 'register_handlers']
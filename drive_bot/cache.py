@@ -0,0 +1,119 @@
+# drive_bot/cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+TITLE_CACHE_SIZE = int(os.environ.get('TITLE_CACHE_SIZE', 2048))
+LIST_CACHE_SIZE = int(os.environ.get('LIST_CACHE_SIZE', 256))
+INLINE_CACHE_SIZE = int(os.environ.get('INLINE_CACHE_SIZE', 1024))
+INLINE_CACHE_TTL = float(os.environ.get('INLINE_CACHE_TTL', 60))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters.
+
+    With ``ttl`` set, entries also expire that many seconds after being set.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING and entry[0] is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            entry = _MISSING
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Exact-title lookups: title -> id, telegram_file_id, share_link, drive_file_id, media_type
+title_cache = LRUCache(TITLE_CACHE_SIZE)
+
+# Link buttons: image id -> title, resolved through title_cache
+image_id_cache = LRUCache(TITLE_CACHE_SIZE)
+
+# Reply parts: (image id, title) -> (caption, link keyboard, link button).
+# Re-uploads get a new id and renames a new title, so entries never go stale
+reply_cache = LRUCache(TITLE_CACHE_SIZE)
+
+# Rendered /list pages: cursor -> (text, next cursor)
+list_cache = LRUCache(LIST_CACHE_SIZE)
+
+# Built inline answers: (normalized query, offset) -> (results, next offset)
+inline_cache = LRUCache(INLINE_CACHE_SIZE, ttl=INLINE_CACHE_TTL)
+
+
+# Called with the titles after every local invalidation (multi-worker mode)
+_invalidation_listeners: List[Callable[[Tuple[str, ...]], None]] = []
+
+
+def add_invalidation_listener(listener: Callable[[Tuple[str, ...]], None]):
+    _invalidation_listeners.append(listener)
+
+
+def invalidate_images(*titles: str, propagate: bool = True):
+    """Drop cached entries after an upload or delete; no titles clears all.
+
+    ``propagate=False`` is for invalidations relayed from another worker,
+    so they are not sent back around.
+    """
+    # Any change shifts listings and search results, so those are all stale
+    list_cache.clear()
+    inline_cache.clear()
+    if not titles:
+        title_cache.clear()
+    for title in titles:
+        title_cache.pop(title)
+    if propagate:
+        for listener in _invalidation_listeners:
+            try:
+                listener(titles)
+            except Exception:
+                logger.exception("Cache invalidation listener failed")
+
+
+__all__ = [
+    'LRUCache', 'title_cache', 'image_id_cache', 'reply_cache', 'list_cache', 'inline_cache',
+    'invalidate_images', 'add_invalidation_listener'
+]
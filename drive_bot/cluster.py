@@ -0,0 +1,309 @@
+# drive_bot/cluster.py
+"""Multi-process webhook mode.
+
+A small aiohttp front receives Telegram's webhook calls and hands each raw
+update to one of N worker processes, chosen by chat so that a chat's
+updates are always handled by the same worker, in order. Inline queries
+go to their user's worker, where the debounce drops superseded
+keystrokes, but are not ordered. Every worker runs
+its own Application (no updater) with the normal handlers, database pool
+and caches. Cache invalidations are relayed through the front so that an
+upload or delete in one worker clears the stale entries in all the others.
+Workers serve their metrics locally; the front merges them into /metrics
+on the public port.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+from typing import Any, Dict, List, Optional, Tuple
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+from telegram import Bot, Update
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get('WORKERS', 1))
+# Optional; Telegram echoes it in a header so the front can reject forgeries
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or None
+# How often the front checks for crashed workers
+SUPERVISE_INTERVAL = 5.0
+# Where workers serve their metrics for the front to collect
+METRICS_LOCAL_HOST = '127.0.0.1'
+METRICS_SCRAPE_TIMEOUT = 5.0
+
+_CHAT_UPDATES = ('message', 'edited_message', 'channel_post', 'edited_channel_post')
+_USER_UPDATES = ('inline_query', 'chosen_inline_result', 'callback_query',
+                 'shipping_query', 'pre_checkout_query', 'poll_answer',
+                 'my_chat_member', 'chat_member', 'chat_join_request')
+# Routed by user but not ordered: waiting for the previous keystroke would
+# defeat the inline debounce, which keeps only the latest one
+_UNORDERED_UPDATES = ('inline_query', 'chosen_inline_result')
+
+
+def partition_key(data: Dict[str, Any]) -> Optional[int]:
+    """Chat id of a raw update, falling back to the user id; None if neither"""
+    for field in _CHAT_UPDATES:
+        if field in data:
+            return data[field].get('chat', {}).get('id')
+    for field in _USER_UPDATES:
+        if field in data:
+            payload = data[field]
+            chat = (payload.get('message') or payload).get('chat')
+            if chat:
+                return chat.get('id')
+            user = payload.get('from') or payload.get('user')
+            return user.get('id') if user else None
+    return None
+
+
+def ordering_key(data: Dict[str, Any]) -> Optional[int]:
+    """Key whose updates a worker handles one after another; None if unordered"""
+    if any(field in data for field in _UNORDERED_UPDATES):
+        return None
+    return partition_key(data)
+
+
+def worker_for(data: Dict[str, Any], workers: int) -> int:
+    key = partition_key(data)
+    return key % workers if key is not None else data.get('update_id', 0) % workers
+
+
+class Worker:
+    """One worker process's update loop.
+
+    Updates of one chat run one after another; different chats run
+    concurrently up to CONCURRENT_UPDATES. Inline queries and chosen inline
+    results are never chained, so they run concurrently too.
+    """
+
+    def __init__(self, index: int, inbox, outbox):
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.app = None
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._running: set = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        from telegram.ext import ApplicationBuilder
+        from drive_bot.cache import add_invalidation_listener
+        from drive_bot.config import TELEGRAM_BOT_TOKEN
+        from drive_bot.database import migration_backfills
+        from drive_bot.jobs import resume_upload_jobs
+        from drive_bot.reconcile import reconciler
+        from drive_bot.ratelimit import TELEGRAM_GLOBAL_RATE, TelegramRateLimiter, split_drive_budget
+        from drive_bot.web import METRICS_PORT, web_server
+        from drive_bot.bot import CONCURRENT_UPDATES, register_handlers
+
+        self._slots = asyncio.Semaphore(CONCURRENT_UPDATES)
+        # The API budgets are per bot and per service account, not per process
+        split_drive_budget(WORKERS)
+        self.app = (ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).updater(None)
+                    .concurrent_updates(CONCURRENT_UPDATES)
+                    .rate_limiter(TelegramRateLimiter(global_rate=TELEGRAM_GLOBAL_RATE / WORKERS))
+                    .build())
+        register_handlers(self.app)
+        await self.app.initialize()
+        await self.app.start()
+
+        add_invalidation_listener(
+            lambda titles: self.outbox.put(('invalidate', self.index, titles)))
+        # Each worker serves its own metrics on the next port up, locally;
+        # the front merges them on the public port
+        web_server.host = METRICS_LOCAL_HOST
+        web_server.port = METRICS_PORT + self.index if METRICS_PORT else 0
+        await web_server.start()
+        if self.index == 0:
+            # Only one worker picks up interrupted uploads, follows Drive
+            # changes and runs migration backfills
+            await resume_upload_jobs(self.app.bot)
+            reconciler.start()
+            migration_backfills.start()
+        logger.info(f"Worker {self.index} ready")
+
+    async def run(self):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                message = await loop.run_in_executor(None, self.inbox.get)
+                if message is None:
+                    break
+                kind, payload = message
+                if kind == 'update':
+                    self.dispatch(payload)
+                elif kind == 'invalidate':
+                    from drive_bot.cache import invalidate_images
+                    invalidate_images(*payload, propagate=False)
+        finally:
+            await self.stop()
+
+    def dispatch(self, data: Dict[str, Any]):
+        update = Update.de_json(data, self.app.bot)
+        key = ordering_key(data)
+        previous = self._tails.get(key) if key is not None else None
+        task = asyncio.create_task(self._process(update, previous))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        if key is not None:
+            self._tails[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+    async def _process(self, update: Update, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        async with self._slots:
+            await self.app.process_update(update)
+
+    def _forget(self, key: int, task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def stop(self):
+        from drive_bot.bot import post_stop
+        if self._running:
+            await asyncio.wait(list(self._running))
+        await self.app.stop()
+        await post_stop(self.app)
+        await self.app.shutdown()
+        logger.info(f"Worker {self.index} stopped")
+
+
+def _worker_main(index: int, inbox, outbox):
+    """Process entry point; must stay importable for the spawn start method"""
+    from drive_bot.config import LOG_FILE
+    from drive_bot.logger import setup_logging
+    # Importing drive_bot opens no log file and the front has already
+    # migrated the database, so this is the worker's only setup. Rotation
+    # is not safe with several processes writing one file
+    base, extension = os.path.splitext(LOG_FILE)
+    setup_logging(f"{base}.worker{index}{extension}")
+    asyncio.run(Worker(index, inbox, outbox).run())
+
+
+class Cluster:
+    """The webhook front: receives updates and feeds the worker processes"""
+
+    def __init__(self, workers: int, token: str, webhook_url: str):
+        self.workers = max(1, workers)
+        self.token = token
+        self.webhook_url = webhook_url
+        # Spawn, not fork: the parent already runs threads (aiohttp, logging)
+        self._context = multiprocessing.get_context('spawn')
+        self.inboxes = [self._context.Queue() for _ in range(self.workers)]
+        self.outbox = self._context.Queue()
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * self.workers
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._session: Optional[ClientSession] = None
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=_worker_main, args=(index, self.inboxes[index], self.outbox),
+            name=f"godrive-worker-{index}", daemon=False)
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get(
+                'X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        self.inboxes[worker_for(data, self.workers)].put(('update', data))
+        return web.Response()
+
+    async def _worker_metrics(self, index: int, port: int) -> Optional[str]:
+        try:
+            async with self._session.get(
+                    f"http://{METRICS_LOCAL_HOST}:{port + index}/metrics") as response:
+                return await response.text() if response.status == 200 else None
+        except (ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Metrics of worker {index} unavailable: {e}")
+            return None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Every worker's metrics, labelled by worker; Render exposes only PORT"""
+        from drive_bot.metrics import merge_expositions
+        from drive_bot.web import CONTENT_TYPE, METRICS_PORT
+        if not METRICS_PORT:
+            raise web.HTTPNotFound()
+        pages = await asyncio.gather(*(self._worker_metrics(index, METRICS_PORT)
+                                       for index in range(self.workers)))
+        text = merge_expositions(
+            {str(index): page for index, page in enumerate(pages) if page is not None}, 'worker')
+        return web.Response(text=text, headers={'Content-Type': CONTENT_TYPE})
+
+    async def _relay_invalidations(self):
+        """Forward each worker's cache invalidations to every other worker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self._next_outbox_message)
+            if message is None:
+                if self._stopping:
+                    return
+                continue
+            _, source, titles = message
+            for index, inbox in enumerate(self.inboxes):
+                if index != source:
+                    inbox.put(('invalidate', titles))
+
+    def _next_outbox_message(self) -> Optional[Tuple]:
+        try:
+            return self.outbox.get(timeout=1)
+        except queue.Empty:
+            return None
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    self._spawn(index)
+
+    async def on_startup(self, app: web.Application):
+        self._session = ClientSession(timeout=ClientTimeout(total=METRICS_SCRAPE_TIMEOUT))
+        for index in range(self.workers):
+            self._spawn(index)
+        self._tasks = [
+            asyncio.create_task(self._relay_invalidations()),
+            asyncio.create_task(self._supervise()),
+        ]
+        async with Bot(self.token) as bot:
+            await bot.set_webhook(
+                self.webhook_url,
+                drop_pending_updates=True,
+                allowed_updates=Update.ALL_TYPES,
+                secret_token=WEBHOOK_SECRET
+            )
+        logger.info(f"Webhook set, dispatching to {self.workers} workers")
+
+    async def on_cleanup(self, app: web.Application):
+        self._stopping = True
+        self._tasks[1].cancel()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            if process is not None:
+                # Workers drain their uploads before exiting
+                await loop.run_in_executor(None, process.join)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._session.close()
+
+    def run(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_post(f"/{self.token}", self.handle_update)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        web.run_app(app, host=host, port=port, print=None)
+
+
+__all__ = ['Cluster', 'Worker', 'WORKERS', 'partition_key', 'ordering_key', 'worker_for']
@@ -0,0 +1,87 @@
+# drive_bot/coalesce.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Returned by Coalescer.run when a newer request made the result irrelevant
+SUPERSEDED = object()
+
+
+class Coalescer:
+    """Latest-wins request handling per owner plus single-flight execution.
+
+    Every request first waits out a short debounce; if the same owner sends
+    a newer request meanwhile, the older one is dropped. Requests that make
+    it through share one execution per key, and an owner's request stops
+    waiting as soon as that owner sends something newer.
+    """
+
+    def __init__(self, debounce: float):
+        self.debounce = debounce
+        self._current: Dict[Hashable, asyncio.Event] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = dict.fromkeys(
+            ('received', 'dropped', 'superseded', 'coalesced', 'executed'), 0)
+
+    async def wait_turn(self, owner: Hashable) -> Optional[asyncio.Event]:
+        """Register a request and debounce it.
+
+        Returns a ticket for run()/finish(), or None when a newer request from
+        the same owner arrived during the debounce.
+        """
+        self.stats['received'] += 1
+        previous = self._current.get(owner)
+        if previous is not None:
+            previous.set()
+        ticket = asyncio.Event()
+        self._current[owner] = ticket
+
+        if self.debounce > 0:
+            try:
+                await asyncio.wait_for(ticket.wait(), self.debounce)
+            except asyncio.TimeoutError:
+                pass
+        if ticket.is_set():
+            self.stats['dropped'] += 1
+            return None
+        return ticket
+
+    async def run(self, ticket: asyncio.Event, key: Hashable,
+                  factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await factory() shared by all callers with the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+            self.stats['executed'] += 1
+        else:
+            self.stats['coalesced'] += 1
+
+        superseded = asyncio.ensure_future(ticket.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {task, superseded}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            superseded.cancel()
+        if task not in done:
+            # The shared execution keeps running for any other waiters
+            self.stats['superseded'] += 1
+            return SUPERSEDED
+        return task.result()
+
+    def finish(self, owner: Hashable, ticket: Optional[asyncio.Event]):
+        """Forget the owner's request if it is still the newest one"""
+        if ticket is not None and self._current.get(owner) is ticket:
+            del self._current[owner]
+
+    def _settle(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Shared execution for {key!r} failed: {task.exception()}")
+
+
+__all__ = ['Coalescer', 'SUPERSEDED']
@@ -1,65 +1,39 @@
+import os
 import sqlite3
 import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from drive_bot.config import DB_PATH
+from drive_bot.cache import image_id_cache, title_cache
+from drive_bot.metrics import db_errors, db_latency, db_lock_retries
+from drive_bot.migrations import BACKFILL_BATCH_SIZE, BACKFILL_PAUSE, backfill_batch, migrate
 import logging
 
 logger = logging.getLogger(__name__)
 
+DB_READ_WORKERS = int(os.environ.get('DB_READ_WORKERS', 2))
+ACCESS_FLUSH_INTERVAL = float(os.environ.get('ACCESS_FLUSH_INTERVAL', 30))
+ACCESS_FLUSH_THRESHOLD = int(os.environ.get('ACCESS_FLUSH_THRESHOLD', 500))
+STATEMENT_CACHE_SIZE = 256
 
-def init_db():
-    """Initialize the database with enhanced schema and error handling"""
+
+def init_db(db_path: str = DB_PATH):
+    """Create or upgrade the database schema.
+
+    The schema lives in drive_bot/migrations; this applies whatever
+    migrations the file has not had yet. Their backfills are left to
+    ``migration_backfills`` once the bot is up.
+    """
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(db_path)
         conn.execute("PRAGMA journal_mode=WAL")  # Better concurrency
         conn.execute("PRAGMA foreign_keys=ON")   # Enable foreign keys
-        
-        cursor = conn.cursor()
-        
-        # Main images table with improved schema
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                telegram_file_id TEXT NOT NULL,
-                drive_file_id TEXT NOT NULL UNIQUE,
-                share_link TEXT NOT NULL,
-                direct_link TEXT,
-                mime_type TEXT DEFAULT 'image/jpeg',
-                file_size INTEGER,
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_accessed TIMESTAMP,
-                uploader_id INTEGER,
-                is_active BOOLEAN DEFAULT 1,
-                CONSTRAINT title_unique UNIQUE (title)
-            )
-        ''')
-        
-        # Create optimized indexes
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_drive_file_id ON images(drive_file_id)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_upload_time ON images(upload_time)
-        ''')
-        
-        # Metadata table for future expansion
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS metadata (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )
-        ''')
-        
-        # Insert initial metadata if needed
-        cursor.execute('''
-            INSERT OR IGNORE INTO metadata (key, value) 
-            VALUES ('schema_version', '1.1')
-        ''')
-        
-        conn.commit()
+        migrate(conn, backfill=False)
         logger.info("Database initialized successfully")
     except sqlite3.Error as e:
         logger.error(f"Database initialization failed: {e}")
@@ -67,70 +41,122 @@ def init_db():
     finally:
         if conn:
             conn.close()
-            
-# Add this to your database.py
-def migrate_database(conn):
-    """Handle future schema migrations automatically"""
-    cursor = conn.cursor()
-    
-    # Check current schema version
-    cursor.execute("PRAGMA user_version")
-    version = cursor.fetchone()[0]
-    
-    # Migration from version 0 to 1
-    if version == 0:
+
+class ConnectionPool:
+    """Long-lived SQLite connections bound to dedicated worker threads.
+
+    Every worker thread opens one connection, applies the PRAGMAs once and
+    keeps it (and its prepared statement cache) for the life of the process.
+    Writes are serialized on a single writer thread so they never fight over
+    the WAL write lock; reads run on a small pool of reader threads.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, readers: int = DB_READ_WORKERS):
+        self.db_path = db_path
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix='db-read')
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            conn.row_factory = sqlite3.Row  # Return dict-like rows
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")  # 5s timeout
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, func, args, kwargs):
+        conn = self._connection()
         try:
-            cursor.executescript('''
-                ALTER TABLE images ADD COLUMN uploader_id INTEGER;
-                ALTER TABLE images ADD COLUMN last_accessed TIMESTAMP;
-                PRAGMA user_version = 1;
-            ''')
+            result = func(*args, conn=conn, **kwargs)
             conn.commit()
-            logger.info("Database migrated to version 1")
-        except sqlite3.Error as e:
+            return result
+        except Exception:
             conn.rollback()
-            logger.error(f"Migration failed: {e}")
             raise
 
-def db_operation(func):
-    """Enhanced decorator for safe database operations with retry logic"""
+    async def run(self, func, *args, readonly: bool = False, **kwargs):
+        """Run func(*args, conn=..., **kwargs) on a pool thread and commit"""
+        executor = self._readers if readonly else self._writer
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, self._call, func, args, kwargs)
+
+    def close(self):
+        """Stop the worker threads and close their connections"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+pool = ConnectionPool()
+
+
+def db_operation(func=None, *, readonly: bool = False):
+    """Run a synchronous query function on the connection pool with retry logic.
+
+    The decorated function receives a pooled connection as ``conn`` and is
+    awaited by callers; ``readonly=True`` routes it to the reader threads.
+    """
+    if func is None:
+        return functools.partial(db_operation, readonly=readonly)
+
+    operation = func.__name__
+    mode = 'read' if readonly else 'write'
+
+    @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        conn = None
         max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                conn.row_factory = sqlite3.Row  # Return dict-like rows
-                conn.execute("PRAGMA busy_timeout=5000")  # 5s timeout
-                kwargs['conn'] = conn
-                result = await func(*args, **kwargs)
-                conn.commit()
-                return result
-            except sqlite3.OperationalError as e:
-                if "locked" in str(e) and attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 0.5
-                    logger.warning(f"Database locked, retry {attempt + 1} in {wait_time}s")
-                    await asyncio.sleep(wait_time)
-                    continue
-                logger.error(f"Database operation failed (attempt {attempt + 1}): {e}")
-                if 'update' in kwargs:
-                    await kwargs['update'].message.reply_text("⚠️ Database busy, please try again")
-                return None
-            except sqlite3.Error as e:
-                logger.error(f"Database error: {e}")
-                if conn:
-                    conn.rollback()
-                if 'update' in kwargs:
-                    await kwargs['update'].message.reply_text("⚠️ Database error occurred")
-                return None
-            finally:
-                if conn:
-                    conn.close()
-        return None
+        started = time.perf_counter()
+        try:
+            for attempt in range(max_retries):
+                try:
+                    return await pool.run(func, *args, readonly=readonly, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if "locked" in str(e) and attempt < max_retries - 1:
+                        wait_time = (attempt + 1) * 0.5
+                        logger.warning(f"Database locked, retry {attempt + 1} in {wait_time}s")
+                        db_lock_retries.inc(operation=operation)
+                        await asyncio.sleep(wait_time)
+                        continue
+                    logger.error(f"Database operation failed (attempt {attempt + 1}): {e}")
+                    db_errors.inc(operation=operation)
+                    return None
+                except sqlite3.Error as e:
+                    logger.error(f"Database error: {e}")
+                    db_errors.inc(operation=operation)
+                    return None
+            return None
+        finally:
+            db_latency.observe(time.perf_counter() - started, operation=operation, mode=mode)
     return wrapper
 
+# Deleted images stay as inactive rows until their Drive file is gone for
+# good; a new upload under the same title replaces such a row
+RECLAIM_TITLE = 'DELETE FROM images WHERE title = ? AND is_active = 0'
+
+# What the title cache keeps; all of it lives in idx_images_active_title.
+# The UNIQUE title index always wins an equality on title, so lookups name
+# the covering index to skip reading the table row.
+LOOKUP_COLUMNS = 'id, title, telegram_file_id, share_link, drive_file_id, media_type'
+
 @db_operation
-async def add_image(
+def add_image(
     title: str,
     telegram_file_id: str,
     drive_file_id: str,
@@ -138,94 +164,709 @@ async def add_image(
     direct_link: str = "",
     file_size: Optional[int] = None,
     uploader_id: Optional[int] = None,
-    conn: Optional[sqlite3.Connection] = None
+    mime_type: str = 'image/jpeg',
+    media_type: str = 'photo',
+    content_md5: Optional[str] = None,
+    file_unique_id: Optional[str] = None,
+    conn: sqlite3.Connection = None
 ) -> bool:
     """Add a new image record with complete metadata"""
     try:
         cursor = conn.cursor()
+        cursor.execute(RECLAIM_TITLE, (title,))
         cursor.execute('''
             INSERT INTO images (
                 title, telegram_file_id, drive_file_id,
                 share_link, direct_link, file_size,
-                uploader_id, last_accessed
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                uploader_id, mime_type, media_type, last_accessed,
+                content_md5, file_unique_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             title, telegram_file_id, drive_file_id,
             share_link, direct_link, file_size,
-            uploader_id, datetime.now()
+            uploader_id, mime_type, media_type, datetime.now(),
+            content_md5, file_unique_id
         ))
         return True
     except sqlite3.IntegrityError as e:
         logger.warning(f"Duplicate image: {e}")
         return False
 
-@db_operation
-async def get_image_by_title(
+@db_operation(readonly=True)
+def get_image_by_title(
     title: str,
-    conn: Optional[sqlite3.Connection] = None
+    conn: sqlite3.Connection = None
 ) -> Optional[Dict]:
     """Retrieve image details by title"""
     cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE images SET last_accessed = ? 
-        WHERE title = ?
-    ''', (datetime.now(), title))
-    cursor.execute('''
-        SELECT * FROM images 
+    cursor.execute(f'''
+        SELECT {LOOKUP_COLUMNS} FROM images INDEXED BY idx_images_active_title
         WHERE title = ? AND is_active = 1
         LIMIT 1
     ''', (title,))
     return cursor.fetchone()
 
+@db_operation(readonly=True)
+def get_image_by_id(
+    image_id: int,
+    conn: sqlite3.Connection = None
+) -> Optional[Dict]:
+    """Retrieve image details by primary key"""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {LOOKUP_COLUMNS} FROM images
+        WHERE id = ? AND is_active = 1
+    ''', (image_id,))
+    return cursor.fetchone()
+
 @db_operation
-async def list_images(
-    limit: int = 100,
-    offset: int = 0,
-    conn: Optional[sqlite3.Connection] = None
+def record_accesses(
+    accesses: List[tuple],
+    conn: sqlite3.Connection = None
+) -> bool:
+    """Apply buffered (last_accessed, hits, title) updates in one batch"""
+    conn.executemany('''
+        UPDATE images
+        SET last_accessed = ?, hit_count = COALESCE(hit_count, 0) + ?
+        WHERE title = ?
+    ''', accesses)
+    return True
+
+class AccessTracker:
+    """Write-behind buffer for access timestamps and hit counts.
+
+    Reads only touch memory; the buffer is flushed with one executemany on
+    a timer, when it reaches a size threshold, and once more on shutdown.
+    """
+
+    def __init__(self, interval: float = ACCESS_FLUSH_INTERVAL,
+                 threshold: int = ACCESS_FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._pending: Dict[str, list] = {}
+        self._timer: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    def record(self, title: str):
+        entry = self._pending.get(title)
+        if entry is None:
+            self._pending[title] = [datetime.now(), 1]
+        else:
+            entry[0] = datetime.now()
+            entry[1] += 1
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run())
+        if len(self._pending) >= self.threshold and not self._flushing:
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Write out everything buffered so far"""
+        try:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            stored = await record_accesses(
+                [(seen, hits, title) for title, (seen, hits) in batch.items()])
+            if not stored:
+                # Keep the counts for the next attempt
+                for title, (seen, hits) in batch.items():
+                    entry = self._pending.setdefault(title, [seen, 0])
+                    entry[1] += hits
+                logger.warning(f"Access flush failed, {len(batch)} titles kept")
+        finally:
+            self._flushing = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def stop(self):
+        """Cancel the timer and run a final flush"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flushing is not None:
+            await self._flushing
+        await self.flush()
+
+access_tracker = AccessTracker()
+
+# Wait after a batch failed on a database error
+BACKFILL_RETRY_DELAY = 30
+
+@db_operation
+def run_backfill_batch(
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    conn: sqlite3.Connection = None
+) -> bool:
+    """Run one batch of the first pending migration backfill"""
+    return backfill_batch(conn, batch_size)
+
+class BackfillRunner:
+    """Runs pending migration backfills in the background.
+
+    One batch per writer-thread transaction with a pause in between, so
+    live traffic is served while an old database catches up.
+    """
+
+    def __init__(self, batch_size: int = BACKFILL_BATCH_SIZE, pause: float = BACKFILL_PAUSE):
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                ran = await run_backfill_batch(self.batch_size)
+            except Exception:
+                logger.exception("Migration backfill failed")
+                return
+            if ran is False:
+                return
+            await asyncio.sleep(self.pause if ran else BACKFILL_RETRY_DELAY)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+migration_backfills = BackfillRunner()
+
+@db_operation(readonly=True)
+def get_images_by_titles(
+    titles: List[str],
+    conn: sqlite3.Connection = None
 ) -> List[Dict]:
-    """List all active images with pagination"""
+    """Retrieve several active images with one IN query"""
+    if not titles:
+        return []
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT title, share_link, upload_time 
-        FROM images 
-        WHERE is_active = 1
-        ORDER BY upload_time DESC
-        LIMIT ? OFFSET ?
-    ''', (limit, offset))
+    cursor.execute(f'''
+        SELECT {LOOKUP_COLUMNS} FROM images INDEXED BY idx_images_active_title
+        WHERE title IN ({','.join('?' * len(titles))}) AND is_active = 1
+    ''', titles)
     return cursor.fetchall()
 
+async def find_image(title: str) -> Optional[Dict]:
+    """Exact-title lookup served from the title cache when possible"""
+    image = title_cache.get(title)
+    if image is not None:
+        access_tracker.record(title)
+        return image
+    row = await get_image_by_title(title)
+    if row is None:
+        return None
+    access_tracker.record(title)
+    return _cache_image(row)
+
+async def find_images(titles: List[str]) -> Optional[Dict[str, Dict]]:
+    """Exact-title lookup of several titles; uncached ones share one query.
+
+    Returns {title: image} for the titles that exist, or None if the
+    database is unavailable.
+    """
+    found = {}
+    missing = []
+    for title in titles:
+        image = title_cache.get(title)
+        if image is not None:
+            found[title] = image
+        else:
+            missing.append(title)
+    if missing:
+        rows = await get_images_by_titles(missing)
+        if rows is None:
+            return None
+        for row in rows:
+            found[row['title']] = _cache_image(row)
+    for title in found:
+        access_tracker.record(title)
+    return found
+
+async def find_image_by_id(image_id: int) -> Optional[Dict]:
+    """Primary-key lookup for link buttons, sharing the title cache"""
+    title = image_id_cache.get(image_id)
+    image = title_cache.get(title) if title is not None else None
+    # A title re-uploaded after a delete gets a new id
+    if image is None or image['id'] != image_id:
+        row = await get_image_by_id(image_id)
+        if row is None:
+            return None
+        image = _cache_image(row)
+    access_tracker.record(image['title'])
+    return image
+
+def _cache_image(row) -> Dict:
+    image = {
+        'id': row['id'],
+        'title': row['title'],
+        'telegram_file_id': row['telegram_file_id'],
+        'share_link': row['share_link'],
+        'drive_file_id': row['drive_file_id'],
+        'media_type': row['media_type'],
+    }
+    title_cache.set(image['title'], image)
+    image_id_cache.set(image['id'], image['title'])
+    return image
+
+@db_operation(readonly=True)
+def list_images(
+    limit: int = 100,
+    cursor: Optional[Tuple[str, int]] = None,
+    conn: sqlite3.Connection = None
+) -> List[Dict]:
+    """List active images, newest first, using keyset pagination.
+
+    ``cursor`` is the (upload_time, id) of the last row of the previous
+    page, so every page costs the same index seek regardless of depth.
+    """
+    if cursor is None:
+        rows = conn.execute('''
+            SELECT id, title, upload_time
+            FROM images
+            WHERE is_active = 1
+            ORDER BY upload_time DESC, id DESC
+            LIMIT ?
+        ''', (limit,))
+    else:
+        rows = conn.execute('''
+            SELECT id, title, upload_time
+            FROM images
+            WHERE is_active = 1 AND (upload_time, id) < (?, ?)
+            ORDER BY upload_time DESC, id DESC
+            LIMIT ?
+        ''', (*cursor, limit))
+    return rows.fetchall()
+
 @db_operation
-async def delete_image(
+def delete_image(
     title: str,
-    conn: Optional[sqlite3.Connection] = None
+    conn: sqlite3.Connection = None
 ) -> bool:
     """Soft-delete an image by title"""
     cursor = conn.cursor()
     cursor.execute('''
-        UPDATE images SET is_active = 0 
+        UPDATE images SET is_active = 0, inactive_reason = 'deleted'
         WHERE title = ?
     ''', (title,))
     return cursor.rowcount > 0
 
 @db_operation
-async def search_images(
+def delete_images(
+    titles: List[str],
+    conn: sqlite3.Connection = None
+) -> int:
+    """Soft-delete several images in one transaction"""
+    cursor = conn.cursor()
+    cursor.executemany(
+        "UPDATE images SET is_active = 0, inactive_reason = 'deleted' WHERE title = ?",
+        [(t,) for t in titles])
+    return cursor.rowcount
+
+@db_operation
+def purge_image(
+    title: str,
+    conn: sqlite3.Connection = None
+) -> bool:
+    """Permanently remove an image record by title"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM images WHERE title = ?', (title,))
+    return cursor.rowcount > 0
+
+@db_operation
+def purge_images(
+    titles: List[str],
+    conn: sqlite3.Connection = None
+) -> int:
+    """Permanently remove several image records in one transaction"""
+    cursor = conn.cursor()
+    cursor.executemany('DELETE FROM images WHERE title = ?', [(t,) for t in titles])
+    return cursor.rowcount
+
+@db_operation(readonly=True)
+def find_duplicate(
+    file_unique_id: Optional[str] = None,
+    content_md5: Optional[str] = None,
+    conn: sqlite3.Connection = None
+) -> Optional[Dict]:
+    """An active image with the same Telegram file or the same content hash"""
+    for column, value in (('file_unique_id', file_unique_id), ('content_md5', content_md5)):
+        if not value:
+            continue
+        row = conn.execute(f'''
+            SELECT title, drive_file_id, share_link, direct_link, file_size, content_md5
+            FROM images
+            WHERE {column} = ? AND is_active = 1
+            LIMIT 1
+        ''', (value,)).fetchone()
+        if row is not None:
+            return dict(row)
+    return None
+
+@db_operation(readonly=True)
+def shared_drive_files(
+    drive_file_ids: List[str],
+    excluding_titles: List[str],
+    conn: sqlite3.Connection = None
+) -> set:
+    """Drive files still referenced by active images outside ``excluding_titles``"""
+    if not drive_file_ids:
+        return set()
+    cursor = conn.execute(f'''
+        SELECT DISTINCT drive_file_id FROM images
+        WHERE drive_file_id IN ({','.join('?' * len(drive_file_ids))})
+          AND title NOT IN ({','.join('?' * len(excluding_titles))}) AND is_active = 1
+    ''', (*drive_file_ids, *excluding_titles))
+    return {row['drive_file_id'] for row in cursor.fetchall()}
+
+@db_operation(readonly=True)
+def images_missing_hash(
+    limit: int = 100,
+    after_id: int = 0,
+    conn: sqlite3.Connection = None
+) -> List[Dict]:
+    """Next batch of images without a content hash, in id order"""
+    cursor = conn.execute('''
+        SELECT id, drive_file_id FROM images
+        WHERE content_md5 IS NULL AND id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, limit))
+    return [dict(row) for row in cursor.fetchall()]
+
+@db_operation
+def set_content_hashes(
+    hashes: List[tuple],
+    conn: sqlite3.Connection = None
+) -> bool:
+    """Store (content_md5, drive_file_id) pairs in one batch"""
+    conn.executemany(
+        'UPDATE images SET content_md5 = ? WHERE drive_file_id = ?', hashes)
+    return True
+
+@db_operation(readonly=True)
+def get_metadata(
+    key: str,
+    conn: sqlite3.Connection = None
+) -> Optional[str]:
+    """Value stored under ``key`` in the metadata table"""
+    row = conn.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+    return row['value'] if row else None
+
+@db_operation
+def set_metadata(
+    key: str,
+    value: str,
+    conn: sqlite3.Connection = None
+) -> bool:
+    conn.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (key, value))
+    return True
+
+# SQLite builds before 3.32 accept at most 999 parameters per statement
+_IN_CHUNK = 500
+
+@db_operation
+def apply_drive_changes(
+    changes: List[Tuple[str, str, Optional[str]]],
+    token_key: str,
+    token: str,
+    conn: sqlite3.Connection = None
+) -> Dict[str, List[str]]:
+    """Apply a page of Drive changes and store the next page token atomically.
+
+    Each change is (drive_file_id, state, title) with state 'removed',
+    'trashed' or 'present'; title is set when the file was renamed in Drive.
+    Files gone for good lose their rows and trashed files are soft-deleted.
+    A file back from the trash restores the images its trashing deactivated,
+    but not those removed with /delete. A renamed file renames its image
+    unless several titles share it or the new title is taken. Changes to
+    files no image refers to are ignored. Returns the affected titles by
+    outcome.
+    """
+    latest = {file_id: (state, title) for file_id, state, title in changes}
+    file_ids = list(latest)
+    rows_by_file: Dict[str, List] = {}
+    for start in range(0, len(file_ids), _IN_CHUNK):
+        chunk = file_ids[start:start + _IN_CHUNK]
+        cursor = conn.execute(f'''
+            SELECT id, title, drive_file_id, is_active, inactive_reason FROM images
+            WHERE drive_file_id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        for row in cursor.fetchall():
+            rows_by_file.setdefault(row['drive_file_id'], []).append(row)
+
+    summary = {'purged': [], 'deactivated': [], 'restored': [], 'renamed': []}
+    purge, deactivate, restore, renames = [], [], [], []
+    for file_id, rows in rows_by_file.items():
+        state, title = latest[file_id]
+        active = [row for row in rows if row['is_active']]
+        if state == 'removed':
+            purge.extend(row['id'] for row in rows)
+            summary['purged'].extend(row['title'] for row in rows)
+        elif state == 'trashed':
+            deactivate.extend(row['id'] for row in active)
+            summary['deactivated'].extend(row['title'] for row in active)
+        else:
+            trashed = [row for row in rows
+                       if not row['is_active'] and row['inactive_reason'] == 'trashed']
+            if trashed:
+                # Untrashed in Drive: bring back what the trashing took away
+                restore.extend(row['id'] for row in trashed)
+                summary['restored'].extend(row['title'] for row in trashed)
+                active = active + trashed
+            if title and len(active) == 1 and title != active[0]['title']:
+                renames.append((active[0], title))
+
+    conn.executemany('DELETE FROM images WHERE id = ?', [(i,) for i in purge])
+    conn.executemany(
+        "UPDATE images SET is_active = 0, inactive_reason = 'trashed' WHERE id = ?",
+        [(i,) for i in deactivate])
+    conn.executemany(
+        'UPDATE images SET is_active = 1, inactive_reason = NULL WHERE id = ?',
+        [(i,) for i in restore])
+    for row, title in renames:
+        if conn.execute(
+                'SELECT 1 FROM images WHERE title = ? AND is_active = 1', (title,)).fetchone():
+            logger.warning(f"Not renaming '{row['title']}' to '{title}': title taken")
+            continue
+        conn.execute(RECLAIM_TITLE, (title,))
+        conn.execute('UPDATE images SET title = ? WHERE id = ?', (title, row['id']))
+        summary['renamed'].extend((row['title'], title))
+    conn.execute(
+        'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (token_key, token))
+    return summary
+
+# Upload job states, in order; 'failed' is terminal alongside 'committed'
+JOB_STATES = ('queued', 'downloading', 'uploading', 'permissioned', 'committed')
+JOB_FIELDS = {
+    'state', 'drive_file_id', 'share_link', 'direct_link',
+    'file_size', 'attempts', 'last_error', 'status_message_id', 'content_md5'
+}
+
+# create_upload_job result when the title is taken; job ids start at 1
+TITLE_TAKEN = 0
+
+@db_operation
+def create_upload_job(
+    job: Dict,
+    conn: sqlite3.Connection = None
+) -> int:
+    """Persist a new upload job and return its id, or TITLE_TAKEN.
+
+    The title is taken by an active image or by an upload still in
+    progress. The check is part of the INSERT, so two uploads of one
+    title cannot both get a job, even from different processes.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO upload_jobs (
+            title, telegram_file_id, mime_type, media_type, extension,
+            file_size, uploader_id, uploader_name, chat_id, status_message_id,
+            file_unique_id
+        )
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM images WHERE title = ? AND is_active = 1)
+          AND NOT EXISTS (
+            SELECT 1 FROM upload_jobs
+            WHERE title = ? AND state NOT IN ('committed', 'failed')
+          )
+    ''', (
+        job['title'], job['telegram_file_id'], job['mime_type'],
+        job['media_type'], job['extension'], job.get('file_size'),
+        job.get('uploader_id'), job.get('uploader_name'),
+        job.get('chat_id'), job.get('status_message_id'),
+        job.get('file_unique_id'), job['title'], job['title']
+    ))
+    return cursor.lastrowid if cursor.rowcount else TITLE_TAKEN
+
+@db_operation
+def update_upload_job(
+    job_id: int,
+    conn: sqlite3.Connection = None,
+    **fields
+) -> bool:
+    """Update progress fields of an upload job"""
+    unknown = set(fields) - JOB_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown upload job fields: {unknown}")
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    conn.execute(
+        f"UPDATE upload_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (*fields.values(), job_id)
+    )
+    return True
+
+@db_operation(readonly=True)
+def get_upload_job(
+    job_id: int,
+    conn: sqlite3.Connection = None
+) -> Optional[Dict]:
+    """Retrieve an upload job by id"""
+    row = conn.execute('SELECT * FROM upload_jobs WHERE id = ?', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+@db_operation(readonly=True)
+def unfinished_upload_jobs(
+    conn: sqlite3.Connection = None
+) -> List[Dict]:
+    """Jobs interrupted before they were committed or failed"""
+    cursor = conn.execute('''
+        SELECT * FROM upload_jobs INDEXED BY idx_upload_jobs_unfinished
+        WHERE state NOT IN ('committed', 'failed')
+        ORDER BY id
+    ''')
+    return [dict(row) for row in cursor.fetchall()]
+
+def _commit_job(conn: sqlite3.Connection, job_id: int) -> bool:
+    job = conn.execute('SELECT * FROM upload_jobs WHERE id = ?', (job_id,)).fetchone()
+    existing = conn.execute(
+        'SELECT drive_file_id FROM images WHERE title = ? AND is_active = 1', (job['title'],)
+    ).fetchone()
+    if existing is not None and existing['drive_file_id'] != job['drive_file_id']:
+        return False
+    if existing is None:
+        conn.execute(RECLAIM_TITLE, (job['title'],))
+        conn.execute('''
+            INSERT INTO images (
+                title, telegram_file_id, drive_file_id,
+                share_link, direct_link, file_size,
+                uploader_id, mime_type, media_type, last_accessed,
+                content_md5, file_unique_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            job['title'], job['telegram_file_id'], job['drive_file_id'],
+            job['share_link'], job['direct_link'] or '', job['file_size'],
+            job['uploader_id'], job['mime_type'], job['media_type'], datetime.now(),
+            job['content_md5'], job['file_unique_id']
+        ))
+    conn.execute('''
+        UPDATE upload_jobs SET state = 'committed', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (job_id,))
+    return True
+
+@db_operation
+def commit_upload_job(
+    job_id: int,
+    conn: sqlite3.Connection = None
+) -> bool:
+    """Insert the job's image row and mark the job committed in one transaction.
+
+    Safe to repeat: a row that already holds the job's Drive file counts as
+    committed. Returns False when the title was taken by another file.
+    """
+    return _commit_job(conn, job_id)
+
+@db_operation
+def commit_upload_jobs(
+    job_ids: List[int],
+    conn: sqlite3.Connection = None
+) -> List[int]:
+    """Commit several upload jobs in one transaction.
+
+    Returns the ids committed; jobs whose title was taken are marked failed.
+    """
+    committed = []
+    for job_id in job_ids:
+        if _commit_job(conn, job_id):
+            committed.append(job_id)
+        else:
+            conn.execute('''
+                UPDATE upload_jobs
+                SET state = 'failed', last_error = 'title taken', updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (job_id,))
+    return committed
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images_fts'"
+    ).fetchone()
+    return row is not None
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+@db_operation(readonly=True)
+def search_images(
     query: str,
     limit: int = 20,
-    conn: Optional[sqlite3.Connection] = None
+    offset: int = 0,
+    conn: sqlite3.Connection = None
 ) -> List[Dict]:
-    """Search images by title with fuzzy matching"""
+    """Search active images by title: prefix and substring hits ranked first,
+    then fuzzy trigram matches to tolerate typos"""
+    query = query.strip().lower()
+    if not query:
+        return []
+    if offset:
+        # Ranking spans several queries, so page over the combined list
+        return _search(query, limit + offset, conn)[offset:]
+    return _search(query, limit, conn)
+
+def _search(query: str, limit: int, conn: sqlite3.Connection) -> List[Dict]:
     cursor = conn.cursor()
+
+    if len(query) < 3 or not _has_fts(conn):
+        # Trigrams need 3+ characters; short queries use the NOCASE title index
+        pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if len(query) < 3:
+            # LIKE alone cannot seek a NOCASE index on a BINARY column; the
+            # range narrows the scan to titles starting with the query
+            cursor.execute('''
+                SELECT id, title, telegram_file_id, share_link, media_type
+                FROM images
+                WHERE title COLLATE NOCASE >= ? AND title COLLATE NOCASE < ?
+                  AND title LIKE ? ESCAPE '\\' AND is_active = 1
+                ORDER BY title COLLATE NOCASE
+                LIMIT ?
+            ''', (query, query + '\U0010ffff', pattern + '%', limit))
+            return cursor.fetchall()
+        cursor.execute('''
+            SELECT id, title, telegram_file_id, share_link, media_type
+            FROM images
+            WHERE title LIKE ? ESCAPE '\\' AND is_active = 1
+            ORDER BY title COLLATE NOCASE
+            LIMIT ?
+        ''', (f'%{pattern}%', limit))
+        return cursor.fetchall()
+
+    # Substring matches, prefix matches first, then by bm25 rank
     cursor.execute('''
-        SELECT title, share_link 
-        FROM images 
-        WHERE title LIKE ? AND is_active = 1
+        SELECT i.id, i.title, i.telegram_file_id, i.share_link, i.media_type
+        FROM images_fts f
+        JOIN images i ON i.id = f.rowid
+        WHERE images_fts MATCH ? AND i.is_active = 1
+        ORDER BY substr(lower(i.title), 1, ?) = ? DESC, f.rank
         LIMIT ?
-    ''', (f'%{query}%', limit))
-    return cursor.fetchall()
+    ''', (_fts_phrase(query), len(query), query, limit))
+    results = cursor.fetchall()
+    if len(results) >= limit:
+        return results
 
-@db_operation
-async def get_stats(
-    conn: Optional[sqlite3.Connection] = None
+    # Fuzzy matches: any shared trigram, best overlap first
+    trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+    seen = [row['id'] for row in results]
+    cursor.execute(f'''
+        SELECT i.id, i.title, i.telegram_file_id, i.share_link, i.media_type
+        FROM images_fts f
+        JOIN images i ON i.id = f.rowid
+        WHERE images_fts MATCH ? AND i.is_active = 1
+          AND i.id NOT IN ({','.join('?' * len(seen))})
+        ORDER BY f.rank
+        LIMIT ?
+    ''', (' OR '.join(_fts_phrase(t) for t in sorted(trigrams)), *seen, limit - len(results)))
+    return results + cursor.fetchall()
+
+@db_operation(readonly=True)
+def get_stats(
+    conn: sqlite3.Connection = None
 ) -> Dict:
     """Get database statistics"""
     cursor = conn.cursor()
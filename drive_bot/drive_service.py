@@ -1,19 +1,328 @@
 # drive_service.py
+import os
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+import httplib2
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from drive_bot.config import SCOPES, SERVICE_ACCOUNT_FILE
+from drive_bot.metrics import drive_latency, drive_requests, rate_limit_retries
+from drive_bot.ratelimit import TokenBucket, drive_reads, drive_writes
 import logging
 
 logger = logging.getLogger(__name__)
 
-try:
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    drive_service = build('drive', 'v3', credentials=creds)
-    logger.info("Google Drive service initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Google Drive service: {e}")
-    raise
-
-# Explicitly export drive_service
-__all__ = ['drive_service']
\ No newline at end of file
+DRIVE_WORKERS = int(os.environ.get('DRIVE_WORKERS', 4))
+# How long the batcher waits for more calls before sending a batch
+DRIVE_BATCH_WINDOW = float(os.environ.get('DRIVE_BATCH_WINDOW', 0.05))
+# Retries of a call Drive rejected for exceeding the rate limit
+DRIVE_RATE_RETRIES = int(os.environ.get('DRIVE_RATE_RETRIES', 4))
+MAX_RATE_BACKOFF = 64
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+_READ_METHODS = ('.get', '.list', '.export', '.watch', '.getStartPageToken')
+
+_credentials = None
+_service = None
+_init_lock = threading.Lock()
+
+
+def get_credentials() -> service_account.Credentials:
+    """Service account credentials, loaded on first use"""
+    global _credentials
+    if _credentials is None:
+        with _init_lock:
+            if _credentials is None:
+                _credentials = service_account.Credentials.from_service_account_file(
+                    SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+    return _credentials
+
+
+def get_drive_service():
+    """The Drive v3 client, built once on first use.
+
+    Built from the discovery document bundled with google-api-python-client
+    so no network fetch happens, and deferred so that importing the handlers
+    (and read-only deployments) never pay for it.
+    """
+    global _service
+    if _service is None:
+        creds = get_credentials()
+        with _init_lock:
+            if _service is None:
+                try:
+                    _service = build(
+                        'drive', 'v3',
+                        credentials=creds,
+                        static_discovery=True,
+                        cache_discovery=False
+                    )
+                    logger.info("Google Drive service initialized successfully")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Google Drive service: {e}")
+                    raise
+    return _service
+
+
+# Blocking Drive calls run here instead of on the bot's event loop
+_executor = ThreadPoolExecutor(max_workers=DRIVE_WORKERS, thread_name_prefix='drive')
+_local = threading.local()
+
+
+def _thread_http() -> AuthorizedHttp:
+    """httplib2 is not thread-safe, so every executor thread gets its own"""
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = AuthorizedHttp(get_credentials(), http=httplib2.Http())
+        _local.http = http
+    return http
+
+
+def _method(request) -> str:
+    return getattr(request, 'methodId', None) or 'unknown'
+
+
+def _status(error: Optional[Exception]) -> str:
+    if error is None:
+        return '200'
+    if isinstance(error, HttpError):
+        return str(error.resp.status)
+    return 'error'
+
+
+def _bucket(method: str) -> TokenBucket:
+    return drive_reads if method.endswith(_READ_METHODS) else drive_writes
+
+
+def rate_limit_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to back off if Drive rejected a call for its rate, else None.
+
+    Uses Retry-After when Drive sends one, otherwise exponential backoff
+    with jitter.
+    """
+    if not isinstance(error, HttpError):
+        return None
+    if error.resp.status != 429:
+        reasons = {detail.get('reason') for detail in (error.error_details or [])
+                   if isinstance(detail, dict)}
+        if error.resp.status != 403 or not reasons & RATE_LIMIT_REASONS:
+            return None
+    retry_after = error.resp.get('retry-after')
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return min(2 ** attempt + random.random(), MAX_RATE_BACKOFF)
+
+
+async def _limited(method: str, run):
+    """Await ``run()`` once a token is free, retrying rate limit errors"""
+    bucket = _bucket(method)
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            return await run()
+        except HttpError as e:
+            delay = rate_limit_delay(e, attempt)
+            if delay is None or attempt >= DRIVE_RATE_RETRIES:
+                raise
+            attempt += 1
+            rate_limit_retries.inc(api='drive')
+            logger.warning(f"Drive rate limit on {method}, backing off {delay:.1f}s")
+            bucket.pause(delay)
+
+
+def _timed(method: str, call):
+    """Run a blocking Drive call, recording its latency and status"""
+    started = time.perf_counter()
+    error = None
+    try:
+        return call()
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        drive_latency.observe(time.perf_counter() - started, method=method)
+        drive_requests.inc(method=method, status=_status(error))
+
+
+async def execute(request):
+    """Execute a Drive API request without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    method = _method(request)
+    return await _limited(method, lambda: loop.run_in_executor(
+        _executor, _timed, method, lambda: request.execute(http=_thread_http())))
+
+
+async def execute_resumable(request, on_progress=None):
+    """Run a resumable upload chunk by chunk, reporting progress in between.
+
+    Every chunk is its own request against the Drive quota; a chunk that is
+    rate limited is simply sent again, since the upload session resumes.
+    """
+    loop = asyncio.get_running_loop()
+    method = _method(request)
+    response = None
+    while response is None:
+        status, response = await _limited(method, lambda: loop.run_in_executor(
+            _executor, _timed, method, lambda: request.next_chunk(http=_thread_http())))
+        if status and on_progress:
+            await on_progress(status.progress())
+    return response
+
+# Drive accepts at most 100 calls per batch HTTP request
+BATCH_LIMIT = 100
+
+
+def _run_batch(requests: Dict[str, Any]) -> Dict[str, Tuple[Any, Optional[Exception]]]:
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+        drive_requests.inc(method=_method(requests[request_id]), status=_status(exception))
+
+    batch = get_drive_service().new_batch_http_request(callback=callback)
+    for request_id, request in requests.items():
+        batch.add(request, request_id=request_id)
+    _timed('batch', lambda: batch.execute(http=_thread_http()))
+    return results
+
+
+async def execute_batch(requests: Dict[str, Any]) -> Dict[str, Tuple[Any, Optional[Exception]]]:
+    """Send many Drive calls as batch HTTP requests.
+
+    Takes {request_id: request} and returns {request_id: (response, error)}
+    so each item can fail independently. Drive counts every call in a batch
+    against its quota, so each takes a token, and calls rejected for the
+    rate limit are sent again in a later batch.
+    """
+    loop = asyncio.get_running_loop()
+    results = {}
+    pending = dict(requests)
+    attempt = 0
+    while pending:
+        items = list(pending.items())
+        for start in range(0, len(items), BATCH_LIMIT):
+            chunk = dict(items[start:start + BATCH_LIMIT])
+            for bucket in (drive_reads, drive_writes):
+                tokens = sum(1 for request in chunk.values() if _bucket(_method(request)) is bucket)
+                if tokens:
+                    await bucket.acquire(tokens)
+            results.update(await loop.run_in_executor(_executor, _run_batch, chunk))
+
+        delays = {request_id: rate_limit_delay(results.get(request_id, (None, None))[1], attempt)
+                  for request_id in pending}
+        pending = {request_id: request for request_id, request in pending.items()
+                   if delays[request_id] is not None}
+        if not pending or attempt >= DRIVE_RATE_RETRIES:
+            break
+        attempt += 1
+        delay = max(delays[request_id] for request_id in pending)
+        rate_limit_retries.inc(len(pending), api='drive')
+        logger.warning(f"{len(pending)} batched Drive calls rate limited, retrying in {delay:.1f}s")
+        for bucket in {_bucket(_method(request)) for request in pending.values()}:
+            bucket.pause(delay)
+    return results
+
+
+class DriveBatcher:
+    """Coalesces independent Drive calls into batch HTTP requests.
+
+    Callers await submit() as if executing the request directly; calls made
+    within DRIVE_BATCH_WINDOW of each other share one round-trip, and each
+    caller gets its own response or exception.
+    """
+
+    def __init__(self, window: float = DRIVE_BATCH_WINDOW):
+        self.window = window
+        self._pending: Dict[str, Tuple[Any, asyncio.Future]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._counter = 0
+
+    async def submit(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._counter += 1
+        self._pending[str(self._counter)] = (request, future)
+        if len(self._pending) >= BATCH_LIMIT:
+            self._flush_now()
+        elif self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flusher = None
+        await self._send(self._take())
+
+    def _flush_now(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        asyncio.create_task(self._send(self._take()))
+
+    def _take(self) -> Dict[str, Tuple[Any, asyncio.Future]]:
+        pending, self._pending = self._pending, {}
+        return pending
+
+    async def _send(self, pending: Dict[str, Tuple[Any, asyncio.Future]]):
+        if not pending:
+            return
+        try:
+            if len(pending) == 1:
+                # No point paying the multipart overhead for a single call
+                request_id, (request, _) = next(iter(pending.items()))
+                results = {request_id: (await execute(request), None)}
+            else:
+                results = await execute_batch(
+                    {request_id: request for request_id, (request, _) in pending.items()})
+        except Exception as e:
+            for _, future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for request_id, (_, future) in pending.items():
+            if future.done():
+                continue
+            response, error = results.get(
+                request_id, (None, RuntimeError("No response in Drive batch")))
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(response)
+        logger.debug("Sent Drive batch of %d calls", len(pending))
+
+
+drive_batcher = DriveBatcher()
+
+
+def public_read_permission(file_id: str):
+    """Request that makes a file readable by anyone with the link"""
+    return get_drive_service().permissions().create(
+        fileId=file_id,
+        body={'role': 'reader', 'type': 'anyone'},
+        supportsAllDrives=True
+    )
+
+
+def delete_file(file_id: str):
+    """Request that permanently deletes a Drive file"""
+    return get_drive_service().files().delete(fileId=file_id, supportsAllDrives=True)
+
+
+def trash_file(file_id: str):
+    """Request that moves a Drive file to the trash, from where it can be restored"""
+    return get_drive_service().files().update(
+        fileId=file_id, body={'trashed': True}, fields='id', supportsAllDrives=True)
+
+
+__all__ = [
+    'get_drive_service', 'execute', 'execute_resumable', 'execute_batch',
+    'drive_batcher', 'public_read_permission', 'delete_file', 'trash_file', 'rate_limit_delay',
+    'RATE_LIMIT_REASONS'
+]
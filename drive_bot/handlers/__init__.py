@@ -5,6 +5,10 @@ from drive_bot.handlers.delete_handler import delete_image
 from drive_bot.handlers.text_handler import handle_text
 from drive_bot.handlers.button_handler import button_callback
 from drive_bot.handlers.inline_handler import inline_query
+from drive_bot.handlers.stats_handler import stats
+from drive_bot.handlers.bulk_handler import bulk_start, bulk_done, receive_media
+from drive_bot.handlers.list_handler import list_command, list_callback
+from drive_bot.handlers.backfill_handler import backfill_hashes
 
 __all__ = [
     'start',
@@ -12,5 +16,12 @@ __all__ = [
     'delete_image',
     'handle_text',
     'button_callback',
-    'inline_query'
+    'inline_query',
+    'stats',
+    'bulk_start',
+    'bulk_done',
+    'receive_media',
+    'list_command',
+    'list_callback',
+    'backfill_hashes'
 ]
\ No newline at end of file
@@ -0,0 +1,30 @@
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+from drive_bot.backfill import start_backfill
+from drive_bot.config import ADMIN_ID
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def backfill_hashes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Start hashing images stored before deduplication (admin only)"""
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Admin only command.")
+        return
+
+    message = update.message
+
+    async def on_done(hashed, error):
+        try:
+            if error is not None:
+                await message.reply_text(f"⚠️ Hash backfill stopped: {error}")
+            else:
+                await message.reply_text(f"✅ Hash backfill finished: {hashed} files hashed.")
+        except TelegramError as e:
+            logger.debug(f"Backfill report skipped: {e}")
+
+    if start_backfill(on_done):
+        await message.reply_text("⏳ Hashing stored files in the background...")
+    else:
+        await message.reply_text("⏳ A hash backfill is already running.")
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+from telegram import Update, Message, User
+from telegram.ext import ContextTypes
+from drive_bot.cache import invalidate_images
+from drive_bot.config import ADMIN_ID
+from drive_bot.database import (
+    TITLE_TAKEN, commit_upload_jobs, create_upload_job, update_upload_job
+)
+from drive_bot.drive_service import execute_batch, public_read_permission, trash_file
+from drive_bot.handlers.upload_handler import (
+    media_from_message, report_progress, upload_image
+)
+from drive_bot.jobs import JOB_PROPERTY, run_upload_job
+from drive_bot.transfer import upload_to_drive
+from drive_bot.upload_queue import upload_queue
+from drive_bot.utils import is_valid_title
+
+logger = logging.getLogger(__name__)
+
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', 4))
+# Album items arrive as separate updates; wait this long for the rest
+MEDIA_GROUP_WAIT = float(os.environ.get('MEDIA_GROUP_WAIT', 2.0))
+PROGRESS_INTERVAL = 2.0
+
+# media_group_id -> {'items', 'pattern', 'message', 'user', 'timer'}
+_media_groups: Dict[str, Dict] = {}
+
+
+def title_for(pattern: str, number: int) -> str:
+    """Expand a bulk title pattern; '{n}' is the item number, else appended"""
+    if '{n}' in pattern:
+        return pattern.replace('{n}', str(number))
+    return f"{pattern} {number}"
+
+
+async def bulk_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Start a bulk session: /bulk <title pattern>, then send files, then /done"""
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Admin only command.")
+        return
+
+    pattern = " ".join(context.args).strip() if context.args else ""
+    if not pattern or not is_valid_title(title_for(pattern, 1)):
+        await update.message.reply_text(
+            "⚠️ Usage: /bulk <title pattern>\n"
+            "Use {n} for the item number, e.g. /bulk Holiday {n}\n"
+            "Then send the images and finish with /done"
+        )
+        return
+
+    context.chat_data['bulk'] = {'pattern': pattern, 'items': []}
+    await update.message.reply_text(
+        f"📦 Bulk session started: '{title_for(pattern, 1)}', "
+        f"'{title_for(pattern, 2)}', ...\nSend the files, then /done"
+    )
+
+
+async def bulk_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Finish the current bulk session and upload everything collected"""
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Admin only command.")
+        return
+
+    session = context.chat_data.pop('bulk', None)
+    if not session or not session['items']:
+        await update.message.reply_text("⚠️ No bulk session with files to upload.")
+        return
+
+    await _submit_bulk(update.message, session['pattern'], session['items'],
+                       update.message.from_user, context)
+
+
+async def receive_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Route incoming files to the bulk session, an album or a single upload"""
+    message = update.message
+    if message.from_user.id != ADMIN_ID:
+        await message.reply_text("🚫 Only admin can upload images.")
+        return
+
+    media = media_from_message(message)
+    session = context.chat_data.get('bulk')
+    if session is not None and media:
+        session['items'].append(media)
+        return
+
+    if message.media_group_id and media:
+        _collect_media_group(message, media, context)
+        return
+
+    await upload_image(update, context)
+
+
+def _collect_media_group(message: Message, media: Dict,
+                         context: ContextTypes.DEFAULT_TYPE):
+    group = _media_groups.get(message.media_group_id)
+    if group is None:
+        group = {'items': [], 'pattern': None, 'message': message,
+                 'user': message.from_user, 'timer': None}
+        _media_groups[message.media_group_id] = group
+    group['items'].append(media)
+    # Telegram puts the album caption on one of the items
+    if message.caption and not group['pattern']:
+        group['pattern'] = message.caption.strip()
+
+    # Restart the quiet-period timer on every new item
+    if group['timer']:
+        group['timer'].cancel()
+    group['timer'] = asyncio.create_task(
+        _flush_media_group(message.media_group_id, context))
+
+
+async def _flush_media_group(media_group_id: str, context: ContextTypes.DEFAULT_TYPE):
+    await asyncio.sleep(MEDIA_GROUP_WAIT)
+    group = _media_groups.pop(media_group_id, None)
+    if not group:
+        return
+    if not group['pattern']:
+        await group['message'].reply_text(
+            "⚠️ Add a caption to the album to title it, "
+            "e.g. 'Holiday {n}', or use /bulk <pattern>."
+        )
+        return
+    await _submit_bulk(group['message'], group['pattern'], group['items'],
+                       group['user'], context)
+
+
+async def _submit_bulk(message: Message, pattern: str, items: List[Dict],
+                       uploader: User, context: ContextTypes.DEFAULT_TYPE):
+    status = await message.reply_text(f"⏳ Bulk upload of {len(items)} files queued...")
+    try:
+        upload_queue.submit(
+            lambda: _process_bulk(status, pattern, items, uploader, context))
+    except asyncio.QueueFull:
+        await status.edit_text("⚠️ Upload queue is full. Please try again later.")
+
+
+async def _process_bulk(status: Message, pattern: str, items: List[Dict],
+                        uploader: User, context: ContextTypes.DEFAULT_TYPE):
+    """Upload all items concurrently, share them in one batch, commit them in
+    one transaction and report once.
+
+    Every item is an upload job, so a restart before the commit resumes it
+    instead of leaving its Drive file behind.
+    """
+    jobs = [(title_for(pattern, n), media) for n, media in enumerate(items, start=1)]
+    failures: Dict[str, str] = {}
+    job_ids: Dict[str, int] = {}
+    uploaded: Dict[str, Dict] = {}
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+    last_report = 0.0
+
+    async def upload_one(title: str, media: Dict):
+        nonlocal last_report
+        if not is_valid_title(title):
+            failures[title] = "invalid title"
+            return
+        job_id = await create_upload_job({
+            'title': title,
+            'telegram_file_id': media['file_id'],
+            'mime_type': media['mime_type'],
+            'media_type': media['media_type'],
+            'extension': media['extension'],
+            'file_size': media['file_size'],
+            'file_unique_id': media['file_unique_id'],
+            'uploader_id': uploader.id,
+            'uploader_name': uploader.full_name,
+        })
+        if job_id is None:
+            failures[title] = "database error"
+            return
+        if job_id == TITLE_TAKEN:
+            failures[title] = "title already exists"
+            return
+        job_ids[title] = job_id
+
+        async with semaphore:
+            try:
+                drive_file = await upload_to_drive(
+                    context.bot, media, title, uploader.full_name,
+                    on_stage=lambda state: update_upload_job(job_id, state=state),
+                    app_properties={JOB_PROPERTY: str(job_id)})
+            except Exception as e:
+                logger.error(f"Bulk upload of '{title}' failed: {e}", exc_info=True)
+                await update_upload_job(job_id, state='failed', last_error=str(e))
+                failures[title] = "upload failed"
+                return
+        # A reused duplicate is already shared
+        await update_upload_job(
+            job_id, state='permissioned' if drive_file.get('duplicate_of') else 'uploading',
+            drive_file_id=drive_file['id'],
+            share_link=drive_file['webViewLink'],
+            direct_link=drive_file.get('webContentLink', ''),
+            file_size=drive_file['size'], content_md5=drive_file.get('md5'))
+        uploaded[title] = drive_file
+        if time.monotonic() - last_report > PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            await report_progress(status, f"⏳ Bulk upload: {len(uploaded)}/{len(jobs)} uploaded...")
+
+    await asyncio.gather(*(upload_one(title, media) for title, media in jobs))
+
+    # Share every newly uploaded file with one batch request; reused
+    # duplicates are shared already
+    discarded: Dict[str, Dict] = {}
+    to_share = {title: drive_file for title, drive_file in uploaded.items()
+                if not drive_file.get('duplicate_of')}
+    if to_share:
+        await report_progress(status, f"⏳ Sharing {len(to_share)} files...")
+        responses = await execute_batch({
+            title: public_read_permission(drive_file['id'])
+            for title, drive_file in to_share.items()
+        })
+        for title, (_, error) in responses.items():
+            if error is not None:
+                logger.error(f"Sharing '{title}' failed: {error}")
+                failures[title] = "sharing failed"
+                discarded[title] = uploaded.pop(title)
+                await update_upload_job(job_ids[title], state='failed', last_error=str(error))
+
+    # Record everything in a single transaction
+    stored = []
+    if uploaded:
+        committed = await commit_upload_jobs([job_ids[title] for title in uploaded])
+        if committed is None:
+            # The jobs keep their Drive files and finish on their own
+            for title in uploaded:
+                failures[title] = "database error, retrying"
+                try:
+                    upload_queue.submit(
+                        lambda job_id=job_ids[title]: run_upload_job(context.bot, job_id))
+                except asyncio.QueueFull:
+                    pass  # Resumed on the next start
+        else:
+            stored = [title for title in uploaded if job_ids[title] in committed]
+            for title, drive_file in uploaded.items():
+                if title not in stored:
+                    failures[title] = "title already exists"
+                    discarded[title] = drive_file
+        if stored:
+            invalidate_images(*stored)
+
+    # Files that will not be stored are trashed rather than left in Drive
+    to_trash = {title: drive_file for title, drive_file in discarded.items()
+                if not drive_file.get('duplicate_of')}
+    if to_trash:
+        responses = await execute_batch({
+            title: trash_file(drive_file['id']) for title, drive_file in to_trash.items()
+        })
+        for title, (_, error) in responses.items():
+            if error is not None:
+                logger.error(f"Trashing the upload of '{title}' failed: {error}")
+
+    summary = f"✅ Bulk upload finished: {len(stored)}/{len(jobs)} stored"
+    if failures:
+        summary += "\n\n" + "\n".join(
+            f"❌ {title}: {reason}" for title, reason in failures.items())
+    await report_progress(status, summary)
+    logger.info(f"Bulk upload '{pattern}': {len(stored)} stored, {len(failures)} failed")
+
+
+__all__ = ['bulk_start', 'bulk_done', 'receive_media', 'title_for']
@@ -1,33 +1,88 @@
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from typing import Dict, Optional, Tuple
+from telegram import CallbackQuery, Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from drive_bot.database import db_operation
+from drive_bot.cache import reply_cache
+from drive_bot.database import find_image, find_image_by_id
 import logging
 
 logger = logging.getLogger(__name__)
 
-@db_operation
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, conn):
+LINK_PREFIX = "l:"
+# Buttons sent before ids were used carry the whole title
+LEGACY_LINK_PREFIX = "link_"
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def encode_link(image_id: int) -> str:
+    """Pack an image id into callback_data, well under Telegram's 64 bytes"""
+    digits = ""
+    while True:
+        image_id, remainder = divmod(image_id, 36)
+        digits = _BASE36[remainder] + digits
+        if not image_id:
+            return LINK_PREFIX + digits
+
+
+def decode_link(data: str) -> Optional[int]:
+    try:
+        return int(data[len(LINK_PREFIX):], 36)
+    except ValueError:
+        return None
+
+
+def link_keyboard(image_id: int, label: str = "🔗 Get Drive Link") -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(label, callback_data=encode_link(image_id))
+    ]])
+
+
+def reply_parts(image: Dict) -> Tuple[str, InlineKeyboardMarkup, InlineKeyboardButton]:
+    """Caption, link keyboard and titled link button of an image, built once"""
+    # Keyed by title too, so a rename picks up a fresh caption
+    key = (image['id'], image['title'])
+    parts = reply_cache.get(key)
+    if parts is None:
+        callback_data = encode_link(image['id'])
+        parts = (
+            f"📌 {image['title']}",
+            InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔗 Get Drive Link", callback_data=callback_data)
+            ]]),
+            InlineKeyboardButton(f"🔗 {image['title']}", callback_data=callback_data),
+        )
+        reply_cache.set(key, parts)
+    return parts
+
+
+async def _show(query: CallbackQuery, text: str):
+    if query.message is not None and query.message.text is not None:
+        # The link list sent with a media group: keep its other buttons
+        await query.message.reply_text(text)
+    else:
+        await query.edit_message_caption(caption=text, reply_markup=None)
+
+
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle inline button clicks for drive links"""
     query = update.callback_query
     await query.answer()
-    title = query.data.replace("link_", "")
-    cursor = conn.cursor()
+    data = query.data or ""
 
     try:
-        cursor.execute(
-            'SELECT share_link FROM images WHERE title = ?', (title,))
-        result = cursor.fetchone()
+        if data.startswith(LINK_PREFIX):
+            image_id = decode_link(data)
+            result = await find_image_by_id(image_id) if image_id is not None else None
+        else:
+            result = await find_image(data[len(LEGACY_LINK_PREFIX):])
 
         if not result:
-            await query.edit_message_caption(caption="❌ Link not found.")
+            await _show(query, "❌ Link not found.")
             return
 
-        await query.edit_message_caption(
-            caption=f"📌 {title}\n🔗 {result['share_link']}",
-            reply_markup=None
-        )
-        logger.info(f"Served link for: {title}")
+        title = result['title']
+        await _show(query, f"📌 {title}\n🔗 {result['share_link']}")
+        logger.info("Served link for: %s", title)
 
     except Exception as e:
-        logger.exception(f"Error handling callback for '{title}'")
-        await query.edit_message_caption(caption="⚠️ Error retrieving link.")
\ No newline at end of file
+        logger.exception(f"Error handling callback '{data}'")
+        await _show(query, "⚠️ Error retrieving link.")
@@ -1,51 +1,96 @@
+import asyncio
 import logging
-import sqlite3
+from googleapiclient.errors import HttpError
 from telegram import Update
 from telegram.ext import ContextTypes
-from drive_bot.config import ADMIN_ID, DB_PATH
-from drive_bot.drive_service import drive_service
+from drive_bot.cache import invalidate_images
+from drive_bot.config import ADMIN_ID
+from drive_bot.database import (
+    delete_images, get_images_by_titles, purge_images, shared_drive_files
+)
+from drive_bot.drive_service import drive_batcher, rate_limit_delay, trash_file
+from drive_bot.ratelimit import RateLimitBusy
+from drive_bot.utils import split_titles
 
 logger = logging.getLogger(__name__)
 
 async def delete_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Delete an image by title (admin only)."""
+    """Delete one or more images by title (admin only).
+
+    Several titles can be given separated by ';' or on separate lines; their
+    Drive files are trashed together in one batch request. Rows are only
+    soft-deleted: restoring a file from the Drive trash brings its title
+    back, and the reconciler drops the row once the file is gone for good.
+    """
     if update.message.from_user.id != ADMIN_ID:
         await update.message.reply_text("🚫 Admin only command.")
         return
 
-    if not context.args:
-        await update.message.reply_text("⚠️ Usage: /delete <title>")
+    parts = update.message.text.split(maxsplit=1)
+    titles = split_titles(parts[1]) if len(parts) > 1 else []
+    if not titles:
+        await update.message.reply_text(
+            "⚠️ Usage: /delete <title>\n"
+            "Several titles: /delete title one; title two"
+        )
         return
 
-    title = " ".join(context.args).strip()
-
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        rows = await get_images_by_titles(titles) or []
+        found = {row['title']: row['drive_file_id'] for row in rows}
+        failures = {title: "not found" for title in titles if title not in found}
 
-        cursor.execute(
-            "SELECT drive_file_id FROM images WHERE title = ?",
-            (title,)
-        )
-        result = cursor.fetchone()
-
-        if not result:
-            await update.message.reply_text("🚫 Image not found.")
+        # Deduplicated uploads share Drive files; keep those still referenced
+        shared = await shared_drive_files(list(set(found.values())), list(found))
+        if shared is None:
+            await update.message.reply_text("⚠️ Database busy, please try again")
             return
+        deleted = [title for title, file_id in found.items() if file_id in shared]
+        to_delete = {title: file_id for title, file_id in found.items() if file_id not in shared}
+        gone = []
 
-        drive_file_id = result[0]
-
-        # Delete from Google Drive
-        drive_service.files().delete(fileId=drive_file_id).execute()
+        # Trash in Google Drive; calls are coalesced into batch requests
+        responses = await asyncio.gather(
+            *(drive_batcher.submit(trash_file(file_id)) for file_id in to_delete.values()),
+            return_exceptions=True
+        )
+        for title, response in zip(to_delete, responses):
+            if isinstance(response, HttpError) and response.resp.status == 404:
+                # Already gone from Drive, just drop the dead record
+                gone.append(title)
+            elif isinstance(response, RateLimitBusy) or rate_limit_delay(response, 0) is not None:
+                logger.warning(f"Drive delete of '{title}' rate limited: {response}")
+                failures[title] = "Google Drive rate limit, try again in a minute"
+            elif isinstance(response, Exception):
+                logger.error(f"Drive delete of '{title}' failed: {response}")
+                failures[title] = str(response)
+            else:
+                deleted.append(title)
 
-        # Delete from database
-        cursor.execute("DELETE FROM images WHERE title = ?", (title,))
-        conn.commit()
-        conn.close()
+        if deleted:
+            await delete_images(deleted)
+        if gone:
+            await purge_images(gone)
+            deleted.extend(gone)
+        if deleted:
+            invalidate_images(*deleted)
 
-        await update.message.reply_text(f"🗑️ '{title}' deleted successfully.")
-        logger.info(f"Deleted image: {title}")
+        if len(titles) == 1:
+            if deleted:
+                await update.message.reply_text(f"🗑️ '{titles[0]}' deleted successfully.")
+            elif failures[titles[0]] == "not found":
+                await update.message.reply_text("🚫 Image not found.")
+            else:
+                await update.message.reply_text(f"❌ Error: {failures[titles[0]]}")
+        else:
+            summary = f"🗑️ Deleted {len(deleted)}/{len(titles)} images"
+            if failures:
+                summary += "\n\n" + "\n".join(
+                    f"❌ {title}: {reason}" for title, reason in failures.items())
+            await update.message.reply_text(summary)
+        for title in deleted:
+            logger.info(f"Deleted image: {title}")
 
     except Exception as e:
-        logger.exception(f"Error deleting image '{title}'")
+        logger.exception(f"Error deleting images {titles}")
         await update.message.reply_text(f"❌ Error: {e}")
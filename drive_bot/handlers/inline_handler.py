@@ -1,39 +1,106 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram import InlineQueryResultPhoto
+import os
+from typing import Dict, List
+from telegram import Update
+from telegram import InlineQueryResultCachedPhoto, InlineQueryResultCachedDocument
 from telegram.ext import ContextTypes
-import sqlite3
-from drive_bot.config import DB_PATH
+from drive_bot.cache import inline_cache
+from drive_bot.coalesce import Coalescer, SUPERSEDED
+from drive_bot.database import search_images
+from drive_bot.handlers.button_handler import link_keyboard
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.inline_query.query.strip().lower()
-    if not query:
-        return
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT title, telegram_file_id, share_link FROM images WHERE title LIKE ? LIMIT 10",
-        (f"%{query}%",)
-    )
+INLINE_PAGE_SIZE = int(os.environ.get('INLINE_PAGE_SIZE', 20))
+# Deepest offset served; Telegram users rarely scroll further
+INLINE_MAX_RESULTS = 100
+# How long Telegram may cache an answer on its side
+INLINE_CACHE_TIME = int(os.environ.get('INLINE_CACHE_TIME', 300))
+# Quiet period before a keystroke's query runs; newer keystrokes replace it
+INLINE_DEBOUNCE = float(os.environ.get('INLINE_DEBOUNCE', 0.3))
+
+inline_coalescer = Coalescer(INLINE_DEBOUNCE)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def build_results(rows: List[Dict]) -> list:
+    """Inline results keyed by image id, so ids stay stable across pages"""
     results = []
-    
-    for idx, row in enumerate(cursor.fetchall()):
-        title, file_id, share_link = row
+    for row in rows:
+        title = row['title']
+        keyboard = link_keyboard(row['id'], "🔗 Get Link")
+        if row['media_type'] == 'document':
+            results.append(
+                InlineQueryResultCachedDocument(
+                    id=str(row['id']),
+                    document_file_id=row['telegram_file_id'],
+                    title=title,
+                    caption=f"📌 {title}",
+                    reply_markup=keyboard
+                )
+            )
+            continue
         results.append(
-            InlineQueryResultPhoto(
-                id=str(idx),
-                photo_file_id=file_id,
-                thumb_url=share_link,
+            InlineQueryResultCachedPhoto(
+                id=str(row['id']),
+                photo_file_id=row['telegram_file_id'],
                 title=title,
                 caption=f"📌 {title}",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔗 Get Link", callback_data=f"link_{title}")
-                ]])
+                reply_markup=keyboard
             )
         )
-    
-    conn.close()
-    await update.inline_query.answer(results, cache_time=1)
\ No newline at end of file
+    return results
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = normalize_query(update.inline_query.query)
+    if not query:
+        return
+
+    try:
+        offset = max(int(update.inline_query.offset or 0), 0)
+    except ValueError:
+        # The offset comes back from the client; a garbled one starts over
+        offset = 0
+    if offset >= INLINE_MAX_RESULTS:
+        await update.inline_query.answer([], cache_time=INLINE_CACHE_TIME, next_offset="")
+        return
+
+    answer = inline_cache.get((query, offset))
+    if answer is None:
+        user_id = update.inline_query.from_user.id
+        ticket = await inline_coalescer.wait_turn(user_id)
+        if ticket is None:
+            # A newer keystroke from this user replaced the query
+            return
+        try:
+            answer = await inline_coalescer.run(
+                ticket, (query, offset), lambda: _build_answer(query, offset))
+        finally:
+            inline_coalescer.finish(user_id, ticket)
+        if answer is None or answer is SUPERSEDED:
+            return
+
+    results, next_offset = answer
+    await update.inline_query.answer(
+        results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset)
+
+
+async def _build_answer(query: str, offset: int):
+    """Run the search once and cache the built page"""
+    # The last page stops at INLINE_MAX_RESULTS
+    page_size = min(INLINE_PAGE_SIZE, INLINE_MAX_RESULTS - offset)
+    rows = await search_images(query, limit=page_size + 1, offset=offset)
+    if rows is None:
+        return None
+    next_offset = offset + page_size
+    has_more = len(rows) > page_size and next_offset < INLINE_MAX_RESULTS
+    answer = (
+        build_results(rows[:page_size]),
+        str(next_offset) if has_more else ""
+    )
+    inline_cache.set((query, offset), answer)
+    return answer
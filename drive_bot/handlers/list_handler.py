@@ -0,0 +1,95 @@
+import os
+from typing import Optional, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+from drive_bot.cache import list_cache
+from drive_bot.database import list_images
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', 20))
+CALLBACK_PREFIX = "lst:"
+
+
+def encode_cursor(cursor: Optional[Tuple[str, int]]) -> str:
+    """Pack an (upload_time, id) cursor into callback_data"""
+    if cursor is None:
+        return CALLBACK_PREFIX
+    upload_time, image_id = cursor
+    return f"{CALLBACK_PREFIX}{upload_time}|{image_id}"
+
+
+def decode_cursor(data: str) -> Optional[Tuple[str, int]]:
+    payload = data[len(CALLBACK_PREFIX):]
+    if not payload:
+        return None
+    upload_time, image_id = payload.rsplit("|", 1)
+    return upload_time, int(image_id)
+
+
+async def render_page(cursor: Optional[Tuple[str, int]]):
+    """Page text and next cursor, served from the page cache when possible"""
+    page = list_cache.get(cursor)
+    if page is not None:
+        return page
+
+    rows = await list_images(limit=LIST_PAGE_SIZE + 1, cursor=cursor)
+    if rows is None:
+        return None
+    has_more = len(rows) > LIST_PAGE_SIZE
+    rows = rows[:LIST_PAGE_SIZE]
+
+    if not rows:
+        text = "📭 No images yet." if cursor is None else "📭 No more images."
+    else:
+        text = "🖼️ Images (newest first)\n\n" + "\n".join(
+            f"• {row['title']}" for row in rows)
+    next_cursor = (rows[-1]['upload_time'], rows[-1]['id']) if has_more else None
+
+    page = (text, next_cursor)
+    list_cache.set(cursor, page)
+    return page
+
+
+def page_keyboard(cursor, next_cursor) -> Optional[InlineKeyboardMarkup]:
+    buttons = []
+    if cursor is not None:
+        buttons.append(InlineKeyboardButton("⏮ First", callback_data=encode_cursor(None)))
+    if next_cursor is not None:
+        buttons.append(InlineKeyboardButton("Next ▶", callback_data=encode_cursor(next_cursor)))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List stored image titles with inline paging"""
+    try:
+        page = await render_page(None)
+        if page is None:
+            await update.message.reply_text("⚠️ Database busy, please try again")
+            return
+        text, next_cursor = page
+        await update.message.reply_text(text, reply_markup=page_keyboard(None, next_cursor))
+    except Exception as e:
+        logger.exception("Error listing images")
+        await update.message.reply_text("⚠️ Error listing images.")
+
+
+async def list_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle Next/First buttons on a /list message"""
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        cursor = decode_cursor(query.data)
+        page = await render_page(cursor)
+        if page is None:
+            return
+        text, next_cursor = page
+        await query.edit_message_text(text, reply_markup=page_keyboard(cursor, next_cursor))
+    except BadRequest as e:
+        # Pressing First on the first page leaves the message unchanged
+        logger.debug(f"List page not updated: {e}")
+    except Exception as e:
+        logger.exception(f"Error paging list for '{query.data}'")
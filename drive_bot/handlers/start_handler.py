@@ -10,8 +10,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "👋 Welcome to the Drive Bot!\n\n"
             "📤 Admin Upload: /upload <title> + image\n"
+            "📦 Admin Bulk Upload: /bulk <title {n}>, send images, /done\n"
             "🔍 Search: Type any image title\n"
-            "🗑️ Admin Delete: /delete <title>\n\n"
+            "📚 Browse: /list\n"
+            "🗑️ Admin Delete: /delete <title>; <title>...\n\n"
             "📝 Note: Upload images with captions to set titles"
         )
     except Exception as e:
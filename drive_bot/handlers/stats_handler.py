@@ -0,0 +1,35 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from drive_bot.cache import inline_cache, title_cache
+from drive_bot.config import ADMIN_ID
+from drive_bot.database import get_stats
+from drive_bot.handlers.inline_handler import inline_coalescer
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Report library size and cache effectiveness (admin only)"""
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Admin only command.")
+        return
+
+    try:
+        db_stats = await get_stats()
+        cache = title_cache.stats()
+        inline = inline_cache.stats()
+        queries = inline_coalescer.stats
+        await update.message.reply_text(
+            "📊 Bot statistics\n\n"
+            f"🖼️ Images: {db_stats['total_images'] if db_stats else '?'}\n"
+            f"🗂️ Title cache: {cache['size']}/{cache['maxsize']} entries\n"
+            f"✅ Hits: {cache['hits']}  ❌ Misses: {cache['misses']}\n"
+            f"📈 Hit rate: {cache['hit_rate']:.1%}\n"
+            f"🔎 Inline cache: {inline['size']}/{inline['maxsize']} entries, "
+            f"hit rate {inline['hit_rate']:.1%}\n"
+            f"⌨️ Inline queries: {queries['received']} received, "
+            f"{queries['executed']} executed, {queries['dropped']} dropped, "
+            f"{queries['superseded']} superseded, {queries['coalesced']} coalesced"
+        )
+    except Exception as e:
+        logger.error(f"Error in stats handler: {e}")
@@ -1,34 +1,119 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from typing import Dict, List
+from telegram import InlineKeyboardMarkup, InputMediaDocument, InputMediaPhoto, Message, Update
 from telegram.ext import ContextTypes
-from drive_bot.database import db_operation
+from drive_bot.database import find_image, find_images
+from drive_bot.handlers.button_handler import reply_parts
+from drive_bot.utils import split_titles
 import logging
 
 logger = logging.getLogger(__name__)
 
-@db_operation
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE, conn):
-    """Handle text messages as image title searches"""
-    title = update.message.text.strip()
-    cursor = conn.cursor()
+# Telegram albums hold 2 to 10 items
+MEDIA_GROUP_LIMIT = 10
+# Titles served per message; the link list keyboard has one row per title
+MAX_TITLES = 30
+
+
+def _comma_titles(text: str) -> List[str]:
+    titles = []
+    for part in text.split(','):
+        title = part.strip()
+        if title and title not in titles:
+            titles.append(title)
+    return titles
+
+
+async def send_image(message: Message, image: Dict):
+    """Reply with one stored image and its link button"""
+    caption, keyboard, _ = reply_parts(image)
+    if image['media_type'] == 'document':
+        await message.reply_document(
+            document=image['telegram_file_id'], caption=caption, reply_markup=keyboard)
+    else:
+        await message.reply_photo(
+            photo=image['telegram_file_id'], caption=caption, reply_markup=keyboard)
+
+
+async def send_images(message: Message, images: List[Dict]) -> List[Dict]:
+    """Reply with albums of stored images; returns those sent without a button.
+
+    Photos and documents cannot share an album, so each kind gets its own.
+    Album items cannot carry keyboards, and a leftover single item is sent
+    on its own with its button instead.
+    """
+    documents = [image for image in images if image['media_type'] == 'document']
+    photos = [image for image in images if image['media_type'] != 'document']
+    unbuttoned = []
+    for group, media_class in ((photos, InputMediaPhoto), (documents, InputMediaDocument)):
+        for start in range(0, len(group), MEDIA_GROUP_LIMIT):
+            chunk = group[start:start + MEDIA_GROUP_LIMIT]
+            if len(chunk) == 1:
+                await send_image(message, chunk[0])
+                continue
+            await message.reply_media_group(media=[
+                media_class(image['telegram_file_id'], caption=reply_parts(image)[0])
+                for image in chunk
+            ])
+            unbuttoned.extend(chunk)
+    return unbuttoned
+
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle text messages as image title searches.
+
+    Several titles, separated by ';', new lines or commas, are looked up
+    with one query and answered with albums plus one message of link
+    buttons. A text that is itself a title is served even if it has commas.
+    """
+    text = update.message.text.strip()
+    titles = split_titles(text)
 
     try:
-        cursor.execute(
-            'SELECT telegram_file_id, share_link FROM images WHERE title = ?', 
-            (title,))
-        result = cursor.fetchone()
+        if len(titles) == 1 and ',' not in titles[0]:
+            result = await find_image(titles[0])
+            if not result:
+                await update.message.reply_text("🚫 Image not found. Try another title.")
+                return
+            await send_image(update.message, result)
+            logger.info("Served image: %s", titles[0])
+            return
+
+        candidates = titles
+        if len(titles) == 1:
+            candidates = titles + _comma_titles(titles[0])
+        found = await find_images(candidates[:MAX_TITLES + 1])
+        if found is None:
+            await update.message.reply_text("⚠️ Database busy, please try again")
+            return
+        if len(titles) == 1:
+            titles = titles if titles[0] in found else candidates[1:]
+        titles = titles[:MAX_TITLES]
 
-        if not result:
+        images = [found[title] for title in titles if title in found]
+        missing = [title for title in titles if title not in found]
+        if not images:
             await update.message.reply_text("🚫 Image not found. Try another title.")
             return
+        if len(images) == 1:
+            await send_image(update.message, images[0])
+            unbuttoned = []
+        else:
+            unbuttoned = await send_images(update.message, images)
 
-        keyboard = [[InlineKeyboardButton("🔗 Get Drive Link", callback_data=f"link_{title}")]]
-        await update.message.reply_photo(
-            photo=result['telegram_file_id'],
-            caption=f"📌 {title}",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        logger.info(f"Served image: {title}")
+        lines = []
+        if unbuttoned:
+            lines.append("🔗 Drive links:")
+        if missing:
+            lines.append("🚫 Not found: " + ", ".join(missing))
+        if lines:
+            await update.message.reply_text(
+                "\n".join(lines),
+                reply_markup=InlineKeyboardMarkup(
+                    [[reply_parts(image)[2]] for image in unbuttoned]) if unbuttoned else None
+            )
+        for image in images:
+            logger.info("Served image: %s", image['title'])
 
     except Exception as e:
-        logger.exception(f"Error serving image '{title}'")
-        await update.message.reply_text("⚠️ Error retrieving image.")
\ No newline at end of file
+        logger.exception(f"Error serving images '{text}'")
+        await update.message.reply_text("⚠️ Error retrieving image.")
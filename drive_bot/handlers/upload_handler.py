@@ -1,37 +1,70 @@
+import asyncio
 import logging
-import sqlite3
-from io import BytesIO
-from telegram import Update
+import mimetypes
+import os
+from typing import Dict, Optional
+from telegram import Update, Message
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
-from googleapiclient.http import MediaIoBaseUpload
-from drive_bot.config import ADMIN_ID, FOLDER_ID, DB_PATH
-from drive_bot.drive_service import drive_service
+from drive_bot.config import ADMIN_ID
+from drive_bot.database import TITLE_TAKEN, create_upload_job, update_upload_job
+from drive_bot.jobs import run_upload_job
+from drive_bot.transfer import MAX_DOWNLOAD_SIZE
+from drive_bot.upload_queue import upload_queue
+from drive_bot.utils import is_valid_title
 
 logger = logging.getLogger(__name__)
 
-def is_valid_title(title: str) -> bool:
-    """Validate image title format"""
-    if not title or len(title) > 100:
-        return False
-    return all(c.isalnum() or c in ' -_.,' for c in title)
+def media_from_message(message: Message) -> Optional[Dict]:
+    """Describe the photo or document attached to a message, if any"""
+    if message.photo:
+        photo = message.photo[-1]  # Highest resolution
+        return {
+            'file_id': photo.file_id,
+            'file_unique_id': photo.file_unique_id,
+            'file_size': photo.file_size,
+            'mime_type': 'image/jpeg',
+            'media_type': 'photo',
+            'extension': '.jpg',
+        }
+    if message.document:
+        document = message.document
+        mime_type = document.mime_type or 'application/octet-stream'
+        extension = (
+            os.path.splitext(document.file_name or '')[1]
+            or mimetypes.guess_extension(mime_type)
+            or ''
+        )
+        return {
+            'file_id': document.file_id,
+            'file_unique_id': document.file_unique_id,
+            'file_size': document.file_size,
+            'mime_type': mime_type,
+            'media_type': 'document',
+            'extension': extension,
+        }
+    return None
 
 async def upload_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Enhanced upload handler with duplicate checking and better error handling"""
-    conn = None
-    file_stream = None
-    
     try:
         # Authentication check
         if update.message.from_user.id != ADMIN_ID:
             await update.message.reply_text("🚫 Only admin can upload images.")
             return
 
-        # Photo validation
-        if not update.message.photo:
-            await update.message.reply_text("❌ Please send an image file.")
+        # Media validation
+        media = media_from_message(update.message)
+        if not media:
+            await update.message.reply_text("❌ Please send an image or file.")
+            return
+
+        if media['file_size'] and media['file_size'] > MAX_DOWNLOAD_SIZE:
+            await update.message.reply_text(
+                f"❌ File is too large. Telegram bots can download up to "
+                f"{MAX_DOWNLOAD_SIZE // (1024 * 1024)} MB."
+            )
             return
-            
-        photo = update.message.photo[-1]  # Highest resolution
 
         # Title extraction and validation
         title = (
@@ -59,96 +92,49 @@ async def upload_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        # Database connection
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # Duplicate check
-        cursor.execute('SELECT 1 FROM images WHERE title = ?', (title,))
-        if cursor.fetchone():
-            await update.message.reply_text(
+        # Record the job durably, then hand it to the upload queue and
+        # return to the update loop. The job is refused when the title is
+        # taken, including by an upload still in progress
+        status = await update.message.reply_text(f"⏳ Queued '{title}'...")
+        job_id = await create_upload_job({
+            'title': title,
+            'telegram_file_id': media['file_id'],
+            'mime_type': media['mime_type'],
+            'media_type': media['media_type'],
+            'extension': media['extension'],
+            'file_size': media['file_size'],
+            'file_unique_id': media['file_unique_id'],
+            'uploader_id': update.message.from_user.id,
+            'uploader_name': update.message.from_user.full_name,
+            'chat_id': status.chat_id,
+            'status_message_id': status.message_id,
+        })
+        if job_id is None:
+            await status.edit_text("⚠️ Database error. Please try again.")
+            return
+        if job_id == TITLE_TAKEN:
+            await status.edit_text(
                 f"⚠️ Title '{title}' already exists.\n"
                 "Use /list to see existing images or choose a different title."
             )
             return
+        try:
+            position = upload_queue.submit(lambda: run_upload_job(context.bot, job_id))
+        except asyncio.QueueFull:
+            await update_upload_job(job_id, state='failed', last_error='queue full')
+            await status.edit_text("⚠️ Upload queue is full. Please try again later.")
+            return
+        if position > 1:
+            await report_progress(status, f"⏳ Queued '{title}' (position {position})...")
 
-        # Download image from Telegram
-        await update.message.reply_text(f"⏳ Downloading image '{title}'...")
-        tg_file = await context.bot.get_file(photo.file_id)
-        file_stream = BytesIO()
-        await tg_file.download_to_memory(out=file_stream)
-        file_stream.seek(0)
-
-        # Prepare Drive upload
-        file_metadata = {
-            'name': f"{title}.jpg",
-            'parents': [FOLDER_ID],
-            'description': f"Uploaded via Telegram by {update.message.from_user.full_name}",
-            'contentHints': {
-                'indexableText': title  # Improves searchability in Drive
-            }
-        }
-        media = MediaIoBaseUpload(
-            file_stream,
-            mimetype='image/jpeg',
-            resumable=True
-        )
-
-        # Upload to Drive
-        await update.message.reply_text(f"⏳ Uploading to Google Drive...")
-        uploaded_file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id,name,webViewLink,webContentLink',
-            supportsAllDrives=True
-        ).execute()
-
-        # Set public permission
-        drive_service.permissions().create(
-            fileId=uploaded_file['id'],
-            body={'role': 'reader', 'type': 'anyone'},
-            supportsAllDrives=True
-        ).execute()
-
-        # Store metadata in database
-        cursor.execute('''
-            INSERT INTO images (
-                title, 
-                telegram_file_id, 
-                drive_file_id, 
-                share_link,
-                direct_link
-            ) VALUES (?, ?, ?, ?, ?)
-        ''', (
-            title,
-            photo.file_id,
-            uploaded_file['id'],
-            uploaded_file['webViewLink'],
-            uploaded_file.get('webContentLink', '')
-        ))
-        conn.commit()
+    except Exception as e:
+        logger.error(f"Upload request failed: {str(e)}", exc_info=True)
+        await update.message.reply_text("⚠️ Upload failed. Please try again.")
 
-        await update.message.reply_text(
-            f"✅ Successfully uploaded '{title}'\n\n"
-            f"🔗 Share link: {uploaded_file['webViewLink']}"
-        )
-        logger.info(f"Uploaded: {title} (Drive ID: {uploaded_file['id']})")
 
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {str(e)}", exc_info=True)
-        await update.message.reply_text("⚠️ Database error. Please try again.")
-    except Exception as e:
-        logger.error(f"Upload failed: {str(e)}", exc_info=True)
-        await update.message.reply_text(
-            "⚠️ Upload failed. Possible reasons:\n"
-            "- Google Drive quota exceeded\n"
-            "- Network issues\n"
-            "- Invalid file format\n\n"
-            "Please try again later."
-        )
-    finally:
-        # Cleanup resources
-        if conn:
-            conn.close()
-        if file_stream:
-            file_stream.close()
\ No newline at end of file
+async def report_progress(status: Message, text: str):
+    """Update the job's progress message, ignoring edit failures"""
+    try:
+        await status.edit_text(text)
+    except TelegramError as e:
+        logger.debug(f"Progress update skipped: {e}")
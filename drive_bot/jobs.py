@@ -0,0 +1,233 @@
+# drive_bot/jobs.py
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+import httplib2
+import httpx
+from googleapiclient.errors import HttpError
+from telegram import Bot
+from telegram.error import NetworkError, TelegramError
+from drive_bot.cache import invalidate_images
+from drive_bot.config import MAX_RETRIES
+from drive_bot.database import (
+    commit_upload_job, get_upload_job, shared_drive_files, unfinished_upload_jobs,
+    update_upload_job
+)
+from drive_bot.drive_service import (
+    RATE_LIMIT_REASONS, drive_batcher, execute, get_drive_service, public_read_permission,
+    rate_limit_delay, trash_file
+)
+from drive_bot.ratelimit import RateLimitBusy
+from drive_bot.transfer import upload_to_drive
+from drive_bot.upload_queue import upload_queue
+
+logger = logging.getLogger(__name__)
+
+# Drive files carry the job id so a retried job finds its earlier upload
+JOB_PROPERTY = 'godrive_job'
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_BACKOFF = 300
+
+# Retries waiting out their backoff and the startup resume; the jobs are
+# in the database, so cancelling these on shutdown loses nothing
+_background: Set[asyncio.Task] = set()
+
+
+def rate_limit_wait(error: Exception) -> Optional[float]:
+    """How long Drive asked us to back off, if the error is a rate limit"""
+    if isinstance(error, RateLimitBusy):
+        return error.retry_after
+    return rate_limit_delay(error, 0)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient Drive/Telegram/network failures worth another attempt"""
+    if isinstance(error, HttpError):
+        if error.resp.status in RETRYABLE_STATUS:
+            return True
+        reasons = {detail.get('reason') for detail in (error.error_details or [])
+                   if isinstance(detail, dict)}
+        return error.resp.status == 403 and bool(reasons & RATE_LIMIT_REASONS)
+    return isinstance(error, (httplib2.HttpLib2Error, httpx.TransportError, RateLimitBusy,
+                              NetworkError, ConnectionError, TimeoutError))
+
+
+async def report_job(bot: Bot, job: Dict, text: str):
+    """Edit the job's status message, ignoring edit failures"""
+    if not job.get('chat_id') or not job.get('status_message_id'):
+        return
+    try:
+        await bot.edit_message_text(
+            text, chat_id=job['chat_id'], message_id=job['status_message_id'])
+    except TelegramError as e:
+        logger.debug(f"Progress update skipped: {e}")
+
+
+async def _find_uploaded_file(job_id: int):
+    """The Drive file an earlier attempt of this job created, if any"""
+    response = await execute(get_drive_service().files().list(
+        q=(f"appProperties has {{ key='{JOB_PROPERTY}' and value='{job_id}' }} "
+           "and trashed = false"),
+        fields='files(id,webViewLink,webContentLink,size)',
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True
+    ))
+    files = response.get('files', [])
+    return files[0] if files else None
+
+
+async def run_upload_job(bot: Bot, job_id: int):
+    """Advance an upload job from its persisted state to 'committed'.
+
+    Each step records its result before the next one starts, so a job that
+    was interrupted (or failed transiently) picks up where it left off.
+    """
+    job = await get_upload_job(job_id)
+    if not job or job['state'] in ('committed', 'failed'):
+        return
+    title = job['title']
+
+    try:
+        if not job['drive_file_id']:
+            uploaded_file = None
+            if job['attempts'] or job['state'] != 'queued':
+                uploaded_file = await _find_uploaded_file(job_id)
+
+            if uploaded_file is None:
+                async def on_stage(state: str):
+                    await update_upload_job(job_id, state=state)
+                    verb = 'Downloading' if state == 'downloading' else 'Uploading'
+                    await report_job(bot, job, f"⏳ {verb} '{title}'...")
+
+                async def on_progress(progress: float):
+                    await report_job(
+                        bot, job, f"⏳ Uploading '{title}' to Google Drive... {progress:.0%}")
+
+                media = {
+                    'file_id': job['telegram_file_id'],
+                    'file_unique_id': job['file_unique_id'],
+                    'mime_type': job['mime_type'],
+                    'media_type': job['media_type'],
+                    'extension': job['extension'],
+                }
+                uploaded_file = await upload_to_drive(
+                    bot, media, title, job['uploader_name'] or 'admin',
+                    on_progress, on_stage, {JOB_PROPERTY: str(job_id)}
+                )
+
+            job['drive_file_id'] = uploaded_file['id']
+            job['share_link'] = uploaded_file['webViewLink']
+            job['direct_link'] = uploaded_file.get('webContentLink', '')
+            job['file_size'] = int(uploaded_file.get('size') or job['file_size'] or 0) or None
+            # A reused duplicate is already shared
+            job['state'] = 'permissioned' if uploaded_file.get('duplicate_of') else 'uploading'
+            await update_upload_job(
+                job_id, state=job['state'],
+                drive_file_id=job['drive_file_id'], share_link=job['share_link'],
+                direct_link=job['direct_link'], file_size=job['file_size'],
+                content_md5=uploaded_file.get('md5')
+            )
+            if uploaded_file.get('duplicate_of'):
+                logger.info(f"'{title}' has the same content as '{uploaded_file['duplicate_of']}'")
+
+        if job['state'] != 'permissioned':
+            # Granting the same public permission twice is harmless
+            await drive_batcher.submit(public_read_permission(job['drive_file_id']))
+            await update_upload_job(job_id, state='permissioned')
+
+        committed = await commit_upload_job(job_id)
+        if committed is None:
+            raise ConnectionError("Database unavailable while committing upload")
+        if not committed:
+            await update_upload_job(job_id, state='failed', last_error='title taken')
+            await _discard_upload(job)
+            await report_job(bot, job, f"⚠️ Title '{title}' was taken by another upload.")
+            return
+        invalidate_images(title)
+
+        await report_job(
+            bot, job,
+            f"✅ Successfully uploaded '{title}'\n\n"
+            f"🔗 Share link: {job['share_link']}"
+        )
+        logger.info(f"Uploaded: {title} (Drive ID: {job['drive_file_id']}, job {job_id})")
+
+    except Exception as e:
+        attempts = job['attempts'] + 1
+        if is_retryable(e) and attempts < MAX_RETRIES:
+            delay = min(max(2 ** attempts, int(rate_limit_wait(e) or 0)), MAX_BACKOFF)
+            logger.warning(f"Upload job {job_id} failed ({e}), retry {attempts} in {delay}s")
+            await update_upload_job(job_id, attempts=attempts, last_error=str(e))
+            await report_job(bot, job, f"⏳ Upload of '{title}' hit an error, retrying in {delay}s...")
+            _start_background(_retry_later(bot, job_id, delay))
+            return
+
+        logger.error(f"Upload job {job_id} failed: {str(e)}", exc_info=True)
+        await update_upload_job(job_id, state='failed', attempts=attempts, last_error=str(e))
+        if rate_limit_wait(e) is not None:
+            await report_job(
+                bot, job,
+                f"⚠️ Upload of '{title}' failed: Google Drive is rate limiting uploads. "
+                "Please try again in a few minutes."
+            )
+            return
+        await report_job(
+            bot, job,
+            "⚠️ Upload failed. Possible reasons:\n"
+            "- Google Drive quota exceeded\n"
+            "- Network issues\n"
+            "- Invalid file format\n\n"
+            "Please try again later."
+        )
+
+
+async def _discard_upload(job: Dict):
+    """Trash the Drive file of a job that lost its title, unless an image
+    reuses it as a duplicate"""
+    shared = await shared_drive_files([job['drive_file_id']], [job['title']])
+    if shared is None or shared:
+        return
+    try:
+        await execute(trash_file(job['drive_file_id']))
+    except Exception as e:
+        logger.error(f"Trashing the upload of '{job['title']}' failed: {e}")
+
+
+def _start_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _retry_later(bot: Bot, job_id: int, delay: float):
+    await asyncio.sleep(delay)
+    await upload_queue.put(lambda: run_upload_job(bot, job_id))
+
+
+async def _resume(bot: Bot):
+    jobs = await unfinished_upload_jobs() or []
+    for job in jobs:
+        await report_job(bot, job, f"♻️ Resuming upload of '{job['title']}'...")
+        await upload_queue.put(lambda job_id=job['id']: run_upload_job(bot, job_id))
+    if jobs:
+        logger.info(f"Resumed {len(jobs)} unfinished upload jobs")
+
+
+async def resume_upload_jobs(bot: Bot):
+    """Requeue jobs left unfinished by a restart.
+
+    Runs in the background: the queue holds UPLOAD_QUEUE_SIZE jobs, and
+    waiting for room here would hold up startup.
+    """
+    _start_background(_resume(bot))
+
+
+async def stop_upload_jobs():
+    """Cancel pending retries and the resume; the next start picks them up"""
+    tasks = list(_background)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+__all__ = ['run_upload_job', 'resume_upload_jobs', 'stop_upload_jobs', 'is_retryable']
@@ -1,26 +1,185 @@
 # drive_bot/logger.py
+"""Logging that never blocks the event loop.
+
+Loggers only put records on a bounded in-memory queue; a QueueListener
+thread formats them and writes them to the console and to a size-rotated
+LOG_FILE. Records are JSON objects by default and carry the update id,
+handler name and the handler's elapsed time when logged from a handler.
+High-volume "Served ..." lines are sampled.
+"""
+import atexit
+import contextvars
+import copy
+import json
 import logging
 import os
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional
 from drive_bot.config import LOG_FILE
 
-def setup_logging():
-    """Configure logging for the entire application"""
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    
-    # Ensure log directory exists
-    log_dir = Path(LOG_FILE).parent
-    log_dir.mkdir(parents=True, exist_ok=True)
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
-    
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'json' for structured records, 'text' for the classic one-line format
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUPS = int(os.environ.get('LOG_BACKUPS', 5))
+# Records waiting for the writer thread; more are dropped and counted
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Fraction of "Served ..." lines kept; 1 keeps them all
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.1))
+SAMPLED_MESSAGES = ('Served image', 'Served link')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Set by metrics.instrument for the duration of each update handler
+log_context: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    'log_context', default=None)
+
+_listener: Optional[QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current update's id, handler and elapsed time onto records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        if context is not None:
+            record.update_id = context.get('update_id')
+            record.handler = context.get('handler')
+            record.latency_ms = round((time.perf_counter() - context['started']) * 1000, 1)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every 1/rate of the INFO records starting with ``prefixes``"""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE, prefixes=SAMPLED_MESSAGES):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.prefixes = tuple(prefixes)
+        self._seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (self.every == 1 or record.levelno != logging.INFO
+                or not isinstance(record.msg, str) or not record.msg.startswith(self.prefixes)):
+            return True
+        if not self.every:
+            return False
+        self._seen += 1
+        if self._seen % self.every:
+            return False
+        # Lets readers scale sampled counts back up
+        record.sampled = self.every
+        return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Hands records to the listener thread; drops them when it falls behind"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback here, while args are still valid,
+        # but leave the layout to the listener's formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    FIELDS = ('update_id', 'handler', 'latency_ms', 'sampled')
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file: str = LOG_FILE):
+    """Configure logging for the entire application.
+
+    Safe to call again (e.g. in a worker process with its own log file):
+    the previous pipeline is flushed and replaced.
+    """
+    global _listener
+    stop_logging()
+
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+    formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+    outputs = [
+        RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                            encoding='utf-8'),
+        logging.StreamHandler(),
+    ]
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    handler = BoundedQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(handler.queue, *outputs, respect_handler_level=True)
+    _listener.start()
+
     # Set higher level for noisy libraries
     logging.getLogger('httpx').setLevel(logging.WARNING)
-    logging.getLogger('telegram').setLevel(logging.INFO)
\ No newline at end of file
+    logging.getLogger('telegram').setLevel(logging.INFO)
+    return handler
+
+
+def stop_logging():
+    """Write out queued records and close the log files"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for output in _listener.handlers:
+        output.close()
+    _listener = None
+
+
+def dropped_records() -> int:
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            return handler.dropped
+    return 0
+
+
+atexit.register(stop_logging)
+
+__all__ = ['setup_logging', 'stop_logging', 'dropped_records', 'log_context']
@@ -0,0 +1,255 @@
+# drive_bot/metrics.py
+import time
+import functools
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+from drive_bot.logger import log_context
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cached lookup up to a slow Drive upload
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """Base for labelled metrics; values are keyed by the label tuple.
+
+    Drive calls record from executor threads, so updates take a lock.
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirror a running total that is counted elsewhere"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (last one is +Inf), then sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def _render_value(self, key, value) -> List[str]:
+        counts, total = value
+        names = self.label_names + ('le',)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(names, key + (le,))} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds the process's metrics and renders the text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Call collector before each scrape, e.g. to copy stats into gauges"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("Metrics collector failed")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def merge_expositions(expositions: Dict[str, str], label: str) -> str:
+    """Merge several processes' /metrics pages into one.
+
+    Each sample gets ``label`` set to its page's key, and the samples of a
+    metric stay together under one HELP/TYPE header, as the text format
+    requires.
+    """
+    families: Dict[str, List[str]] = {}
+    for key, text in expositions.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# '):
+                parts = line.split(' ', 3)
+                family = parts[2] if len(parts) > 2 else family
+                lines = families.setdefault(family, [])
+                if line not in lines:
+                    lines.append(line)
+                continue
+            if not line.strip() or family is None:
+                continue
+            # The value is last; label values may contain spaces
+            name, _, rest = line.rpartition(' ')
+            extra = _format_labels((label,), (key,))[1:-1]
+            if name.endswith('}'):
+                name = f"{name[:-1]},{extra}}}"
+            else:
+                name = f"{name}{{{extra}}}"
+            families[family].append(f"{name} {rest}")
+    return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+handler_latency = registry.histogram(
+    'godrive_handler_latency_seconds', 'Time spent in each update handler', ['handler'])
+handler_in_progress = registry.gauge(
+    'godrive_handler_in_progress', 'Updates currently being handled', ['handler'])
+handler_errors = registry.counter(
+    'godrive_handler_errors_total', 'Exceptions that escaped a handler', ['handler'])
+
+db_latency = registry.histogram(
+    'godrive_db_operation_seconds',
+    'Database operation time including pool wait and lock retries', ['operation', 'mode'])
+db_lock_retries = registry.counter(
+    'godrive_db_lock_retries_total', 'Database operations retried after a lock', ['operation'])
+db_errors = registry.counter(
+    'godrive_db_errors_total', 'Database operations that failed', ['operation'])
+
+drive_latency = registry.histogram(
+    'godrive_drive_request_seconds', 'Drive API call time', ['method'])
+drive_requests = registry.counter(
+    'godrive_drive_requests_total', 'Drive API calls by HTTP status', ['method', 'status'])
+
+rate_limit_waiting = registry.gauge(
+    'godrive_rate_limit_waiting', 'Calls queued for a rate limiter token', ['limiter'])
+rate_limit_rejected = registry.counter(
+    'godrive_rate_limit_rejected_total',
+    'Calls refused because a rate limiter queue was full', ['limiter'])
+rate_limit_retries = registry.counter(
+    'godrive_rate_limit_retries_total', 'Calls retried after the API asked us to slow down',
+    ['api'])
+
+
+def instrument(name: str):
+    """Wrap an update handler callback with latency, in-flight and error metrics.
+
+    Also sets the logging context, so the handler's log records carry the
+    update id, handler name and elapsed time.
+    """
+    def decorator(callback):
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            handler_in_progress.inc(handler=name)
+            started = time.perf_counter()
+            # Log records from inside the handler carry these fields
+            context = log_context.set({
+                'update_id': getattr(args[0], 'update_id', None) if args else None,
+                'handler': name,
+                'started': started,
+            })
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                handler_errors.inc(handler=name)
+                raise
+            finally:
+                log_context.reset(context)
+                handler_latency.observe(time.perf_counter() - started, handler=name)
+                handler_in_progress.dec(handler=name)
+        return wrapper
+    return decorator
+
+
+__all__ = [
+    'Counter', 'Gauge', 'Histogram', 'Registry', 'registry', 'instrument', 'merge_expositions',
+    'handler_latency', 'handler_in_progress', 'handler_errors',
+    'db_latency', 'db_lock_retries', 'db_errors', 'drive_latency', 'drive_requests',
+    'rate_limit_waiting', 'rate_limit_rejected', 'rate_limit_retries'
+]
@@ -0,0 +1,36 @@
+"""Images and metadata tables"""
+from drive_bot.migrations._schema import column_names
+
+
+def upgrade(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            telegram_file_id TEXT NOT NULL,
+            drive_file_id TEXT NOT NULL UNIQUE,
+            share_link TEXT NOT NULL,
+            direct_link TEXT,
+            mime_type TEXT DEFAULT 'image/jpeg',
+            file_size INTEGER,
+            upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_accessed TIMESTAMP,
+            uploader_id INTEGER,
+            is_active BOOLEAN DEFAULT 1,
+            CONSTRAINT title_unique UNIQUE (title)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_drive_file_id ON images(drive_file_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_time ON images(upload_time)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    # Databases from the first release predate these columns
+    columns = column_names(cursor, 'images')
+    if 'uploader_id' not in columns:
+        cursor.execute('ALTER TABLE images ADD COLUMN uploader_id INTEGER')
+    if 'last_accessed' not in columns:
+        cursor.execute('ALTER TABLE images ADD COLUMN last_accessed TIMESTAMP')
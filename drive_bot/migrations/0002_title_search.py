@@ -0,0 +1,6 @@
+"""Trigram full-text index over titles"""
+from drive_bot.migrations._schema import create_title_search
+
+
+def upgrade(cursor):
+    create_title_search(cursor)
@@ -0,0 +1,7 @@
+"""Per-title hit counter maintained by the access tracker"""
+from drive_bot.migrations._schema import column_names
+
+
+def upgrade(cursor):
+    if 'hit_count' not in column_names(cursor, 'images'):
+        cursor.execute('ALTER TABLE images ADD COLUMN hit_count INTEGER DEFAULT 0')
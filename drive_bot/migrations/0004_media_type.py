@@ -0,0 +1,24 @@
+"""Distinguish photos from documents so they are sent back the same way"""
+from typing import Optional
+from drive_bot.migrations._schema import column_names
+
+
+def upgrade(cursor):
+    if 'media_type' not in column_names(cursor, 'images'):
+        cursor.execute("ALTER TABLE images ADD COLUMN media_type TEXT DEFAULT 'photo'")
+
+
+def backfill(conn, after: int, batch_size: int) -> Optional[int]:
+    # Rows stored before this column defaulted to 'photo', but anything that
+    # is not an image can only have been sent as a document
+    rows = conn.execute(
+        'SELECT id FROM images WHERE id > ? ORDER BY id LIMIT ?', (after, batch_size)
+    ).fetchall()
+    if not rows:
+        return None
+    last = rows[-1][0]
+    conn.execute('''
+        UPDATE images SET media_type = 'document'
+        WHERE id > ? AND id <= ? AND mime_type NOT LIKE 'image/%'
+    ''', (after, last))
+    return last
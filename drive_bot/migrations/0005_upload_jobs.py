@@ -0,0 +1,30 @@
+"""Durable upload jobs so interrupted uploads can be resumed"""
+
+
+def upgrade(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            telegram_file_id TEXT NOT NULL,
+            mime_type TEXT,
+            media_type TEXT,
+            extension TEXT,
+            file_size INTEGER,
+            uploader_id INTEGER,
+            uploader_name TEXT,
+            chat_id INTEGER,
+            status_message_id INTEGER,
+            state TEXT NOT NULL DEFAULT 'queued',
+            drive_file_id TEXT,
+            share_link TEXT,
+            direct_link TEXT,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_upload_jobs_state ON upload_jobs(state)
+    ''')
@@ -0,0 +1,6 @@
+"""Covering index for keyset pagination over active images"""
+from drive_bot.migrations._schema import create_active_recent_index
+
+
+def upgrade(cursor):
+    create_active_recent_index(cursor)
@@ -0,0 +1,107 @@
+"""Content hashes for dedup; several titles may now share one Drive file.
+
+SQLite cannot drop the UNIQUE constraint on drive_file_id in place, so
+the table is rebuilt, keeping ids (the FTS index is keyed by them). The
+rows are copied in batches while triggers mirror every write to the old
+table, so a bot serving the database keeps working during the copy.
+"""
+from typing import Optional
+from drive_bot.migrations._schema import (
+    column_names, create_active_recent_index, create_title_search
+)
+
+IMAGE_COLUMNS = (
+    'id', 'title', 'telegram_file_id', 'drive_file_id', 'share_link', 'direct_link',
+    'mime_type', 'file_size', 'upload_time', 'last_accessed', 'uploader_id',
+    'is_active', 'hit_count', 'media_type'
+)
+MIRROR_TRIGGERS = ('images_copy_insert', 'images_copy_update', 'images_copy_delete')
+
+
+def upgrade(cursor):
+    columns = ', '.join(IMAGE_COLUMNS)
+    values = ', '.join(f'new.{column}' for column in IMAGE_COLUMNS)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS images_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            telegram_file_id TEXT NOT NULL,
+            drive_file_id TEXT NOT NULL,
+            share_link TEXT NOT NULL,
+            direct_link TEXT,
+            mime_type TEXT DEFAULT 'image/jpeg',
+            file_size INTEGER,
+            upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_accessed TIMESTAMP,
+            uploader_id INTEGER,
+            is_active BOOLEAN DEFAULT 1,
+            hit_count INTEGER DEFAULT 0,
+            media_type TEXT DEFAULT 'photo',
+            content_md5 TEXT,
+            file_unique_id TEXT,
+            CONSTRAINT title_unique UNIQUE (title)
+        )
+    ''')
+    # Writes during the copy reach images_new whether or not their row
+    # has been copied yet; the copy skips rows already there
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS images_copy_insert AFTER INSERT ON images BEGIN
+            INSERT OR REPLACE INTO images_new ({columns}) VALUES ({values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS images_copy_update AFTER UPDATE ON images BEGIN
+            DELETE FROM images_new WHERE id = old.id;
+            INSERT OR REPLACE INTO images_new ({columns}) VALUES ({values});
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_copy_delete AFTER DELETE ON images BEGIN
+            DELETE FROM images_new WHERE id = old.id;
+        END
+    ''')
+    # The old table's UNIQUE constraint index still serves its lookups
+    cursor.execute("SELECT tbl_name FROM sqlite_master WHERE name = 'idx_drive_file_id'")
+    if cursor.fetchone() == ('images',):
+        cursor.execute('DROP INDEX idx_drive_file_id')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_drive_file_id ON images_new(drive_file_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_md5 ON images_new(content_md5)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_unique_id ON images_new(file_unique_id)')
+
+    job_columns = column_names(cursor, 'upload_jobs')
+    for column in ('content_md5', 'file_unique_id'):
+        if column not in job_columns:
+            cursor.execute(f'ALTER TABLE upload_jobs ADD COLUMN {column} TEXT')
+
+
+def copy(conn, after: int, batch_size: int) -> Optional[int]:
+    rows = conn.execute(
+        'SELECT id FROM images WHERE id > ? ORDER BY id LIMIT ?', (after, batch_size)
+    ).fetchall()
+    if not rows:
+        return None
+    last = rows[-1][0]
+    columns = ', '.join(IMAGE_COLUMNS)
+    conn.execute(f'''
+        INSERT OR IGNORE INTO images_new ({columns})
+        SELECT {columns} FROM images WHERE id > ? AND id <= ?
+    ''', (after, last))
+    return last
+
+
+def finish(cursor):
+    for trigger in MIRROR_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    # Ids of rows deleted from the end of the old table stay used
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'images'")
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'images_new'", row)
+        if not cursor.rowcount:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('images_new', ?)", row)
+    cursor.execute('DROP TABLE images')
+    cursor.execute('ALTER TABLE images_new RENAME TO images')
+    # Dropping the table dropped its FTS triggers; the FTS index itself
+    # still matches, since ids and titles were copied unchanged
+    create_title_search(cursor, rebuild=False)
+    create_active_recent_index(cursor)
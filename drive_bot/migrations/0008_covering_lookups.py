@@ -0,0 +1,22 @@
+"""Covering indexes for title lookups and unfinished upload jobs.
+
+Title lookups read the active title index alone; is_active is repeated in
+its key so the partial index stays covering. Unfinished upload jobs get a
+partial index over the few rows still in flight. idx_upload_time and
+idx_upload_jobs_state were never used by a query plan and only cost writes.
+"""
+
+
+def upgrade(cursor):
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_images_active_title
+        ON images(title, telegram_file_id, share_link, drive_file_id, media_type, is_active)
+        WHERE is_active = 1
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_upload_jobs_unfinished
+        ON upload_jobs(title)
+        WHERE state NOT IN ('committed', 'failed')
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_upload_time')
+    cursor.execute('DROP INDEX IF EXISTS idx_upload_jobs_state')
@@ -0,0 +1,12 @@
+"""Why an image was deactivated: 'deleted' by /delete or 'trashed' in Drive.
+
+Only trashed images come back when their file is restored from the Drive
+trash. Rows deactivated before this column existed stay NULL and are
+treated as deleted.
+"""
+from drive_bot.migrations._schema import column_names
+
+
+def upgrade(cursor):
+    if 'inactive_reason' not in column_names(cursor, 'images'):
+        cursor.execute('ALTER TABLE images ADD COLUMN inactive_reason TEXT')
@@ -0,0 +1,274 @@
+# drive_bot/migrations/__init__.py
+"""Versioned schema migrations.
+
+Every ``NNNN_name.py`` module in this package is one migration; NNNN is
+the version it brings the database to, recorded in PRAGMA user_version.
+A migration module defines:
+
+- ``upgrade(cursor)``: schema changes, applied in one transaction together
+  with the version bump, so a failure leaves the previous version intact.
+- optionally ``copy(conn, after, batch_size)`` and ``finish(cursor)``, for
+  changes too big for one transaction such as rebuilding a table. Then
+  ``upgrade`` only prepares (and must be safe to repeat), ``copy`` moves
+  one batch of rows with ``id > after`` and returns the last id it
+  handled, or None when nothing is left, and ``finish`` completes the
+  change together with the version bump. Each batch commits on its own,
+  so a bot still serving the database only ever waits for one batch.
+- optionally ``backfill(conn, after, batch_size)``: a data change the code
+  does not rely on, batched the same way. Backfills do not hold up
+  startup: the bot runs them in the background (``backfill_batch``), and
+  migrate.py runs them to completion.
+
+Copy and backfill progress is kept in the metadata table, so an
+interrupted one resumes where it stopped. Every step takes the write lock
+(BEGIN IMMEDIATE) before it looks at what is left to do, so processes
+migrating the same database never apply a step twice.
+
+``dry_run`` applies the pending migrations to a copy of a database and
+reports how long each one takes.
+"""
+import os
+import re
+import time
+import sqlite3
+import importlib
+import pkgutil
+import tempfile
+from types import ModuleType
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 1000))
+# Pause between batches while a bot may be serving the database
+BACKFILL_PAUSE = float(os.environ.get('MIGRATION_BATCH_PAUSE', 0.01))
+
+_NAME = re.compile(r'^(\d{4})_\w+$')
+_COPY_KEY = 'copy_{version:04d}'
+_BACKFILL_KEY = 'backfill_{version:04d}'
+# No batch ran: another process finished the step first
+_NOTHING_LEFT = object()
+
+
+def load_migrations() -> List[ModuleType]:
+    """Migration modules of this package, ordered by version"""
+    migrations = []
+    for module in pkgutil.iter_modules(__path__):
+        match = _NAME.match(module.name)
+        if match:
+            migration = importlib.import_module(f"{__name__}.{module.name}")
+            migration.VERSION = int(match.group(1))
+            migrations.append(migration)
+    migrations.sort(key=lambda migration: migration.VERSION)
+    versions = [migration.VERSION for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return migrations
+
+
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_migrations(conn: sqlite3.Connection) -> List[ModuleType]:
+    version = current_version(conn)
+    return [migration for migration in load_migrations() if migration.VERSION > version]
+
+
+def _describe(migration: ModuleType) -> str:
+    return (migration.__doc__ or migration.__name__).strip().splitlines()[0]
+
+
+def _transaction(conn: sqlite3.Connection, work: Callable):
+    """Run work(cursor) holding the write lock; any exception rolls it back"""
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        result = work(cursor)
+        conn.commit()
+        return result
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _record_version(cursor, migration: ModuleType):
+    if hasattr(migration, 'backfill'):
+        # Recorded with the schema change so a crash cannot lose it
+        cursor.execute(
+            'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+            (_BACKFILL_KEY.format(version=migration.VERSION), '0'))
+    cursor.execute(
+        "INSERT OR REPLACE INTO metadata (key, value) VALUES ('schema_version', ?)",
+        (str(migration.VERSION),))
+    cursor.execute(f"PRAGMA user_version = {migration.VERSION}")
+
+
+def _upgrade(cursor, migration: ModuleType) -> bool:
+    """Apply ``upgrade`` unless the database is past it; True if it ran"""
+    if current_version(cursor) >= migration.VERSION:
+        return False
+    migration.upgrade(cursor)
+    if hasattr(migration, 'copy'):
+        # Kept as is when an interrupted copy is prepared again
+        cursor.execute(
+            'INSERT OR IGNORE INTO metadata (key, value) VALUES (?, ?)',
+            (_COPY_KEY.format(version=migration.VERSION), '0'))
+    else:
+        _record_version(cursor, migration)
+    return True
+
+
+def _batch(conn: sqlite3.Connection, key: str, step: Callable, batch_size: int,
+           done: Optional[Callable] = None):
+    """One batch of ``step`` under the write lock; returns its last id or None"""
+    def work(cursor):
+        row = cursor.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return _NOTHING_LEFT
+        last = step(conn, int(row[0]), batch_size)
+        if last is None:
+            cursor.execute('DELETE FROM metadata WHERE key = ?', (key,))
+            if done is not None:
+                done(cursor)
+        else:
+            cursor.execute('UPDATE metadata SET value = ? WHERE key = ?', (str(last), key))
+        return last
+    return _transaction(conn, work)
+
+
+def _run_batches(conn: sqlite3.Connection, key: str, step: Callable, batch_size: int,
+                 pause: float, done: Optional[Callable] = None) -> int:
+    """Run ``step`` batch by batch to the end; returns the batches run"""
+    batches = 0
+    while True:
+        last = _batch(conn, key, step, batch_size, done)
+        if last is _NOTHING_LEFT:
+            return batches
+        batches += 1
+        if last is None:
+            return batches
+        if pause:
+            time.sleep(pause)
+
+
+def _copy(conn: sqlite3.Connection, migration: ModuleType, batch_size: int,
+          pause: float) -> int:
+    def done(cursor):
+        migration.finish(cursor)
+        _record_version(cursor, migration)
+    return _run_batches(conn, _COPY_KEY.format(version=migration.VERSION),
+                        migration.copy, batch_size, pause, done)
+
+
+def migrate(conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE,
+            pause: float = 0.0, backfill: bool = True) -> List[Dict]:
+    """Apply pending migrations; returns a timing entry per migration.
+
+    ``backfill=False`` leaves backfills for ``backfill_batch`` to run later.
+    """
+    report = []
+    entries = {}
+    for migration in load_migrations():
+        started = time.perf_counter()
+        applied = _transaction(conn, lambda cursor: _upgrade(cursor, migration))
+        batches = _copy(conn, migration, batch_size, pause) if hasattr(migration, 'copy') else 0
+        if not applied and not batches:
+            continue
+        entry = entries[migration.VERSION] = {
+            'version': migration.VERSION,
+            'description': _describe(migration),
+            'schema_seconds': time.perf_counter() - started,
+            'backfill_seconds': 0.0,
+            'batches': batches,
+        }
+        logger.info(f"Database migrated to version {migration.VERSION}")
+        report.append(entry)
+
+    if backfill:
+        for migration, batches, seconds in run_backfills(conn, batch_size, pause):
+            entry = entries.get(migration.VERSION)
+            if entry is None:
+                entry = entries[migration.VERSION] = {
+                    'version': migration.VERSION, 'description': _describe(migration),
+                    'schema_seconds': 0.0, 'backfill_seconds': 0.0, 'batches': 0,
+                }
+                report.append(entry)
+            entry['backfill_seconds'] = seconds
+            entry['batches'] += batches
+    return report
+
+
+def _pending_backfills(conn: sqlite3.Connection) -> List[ModuleType]:
+    version = current_version(conn)
+    keys = {key for (key,) in conn.execute(
+        "SELECT key FROM metadata WHERE key LIKE 'backfill_%'")}
+    return [migration for migration in load_migrations()
+            if hasattr(migration, 'backfill') and migration.VERSION <= version
+            and _BACKFILL_KEY.format(version=migration.VERSION) in keys]
+
+
+def run_backfills(conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE,
+                  pause: float = 0.0) -> List[tuple]:
+    """Run every pending backfill to the end; returns (migration, batches, seconds)"""
+    done = []
+    for migration in _pending_backfills(conn):
+        started = time.perf_counter()
+        batches = _run_batches(conn, _BACKFILL_KEY.format(version=migration.VERSION),
+                               migration.backfill, batch_size, pause)
+        if batches:
+            logger.info(f"Backfill of version {migration.VERSION} done in {batches} batches")
+            done.append((migration, batches, time.perf_counter() - started))
+    return done
+
+
+def backfill_batch(conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> bool:
+    """Run one batch of the first pending backfill; False once none is left"""
+    for migration in _pending_backfills(conn):
+        last = _batch(conn, _BACKFILL_KEY.format(version=migration.VERSION),
+                      migration.backfill, batch_size)
+        if last is None:
+            logger.info(f"Backfill of version {migration.VERSION} done")
+        if last is not _NOTHING_LEFT:
+            return True
+    return False
+
+
+def dry_run(db_path: str, batch_size: int = BACKFILL_BATCH_SIZE) -> List[Dict]:
+    """Time the pending migrations on a throwaway copy of ``db_path``"""
+    handle, copy_path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(copy_path)
+    try:
+        # The backup API gives a consistent copy even while the bot writes
+        source.backup(target)
+        source.close()
+        return migrate(target, batch_size)
+    finally:
+        target.close()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(copy_path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def format_report(report: List[Dict]) -> str:
+    if not report:
+        return "No pending migrations."
+    lines = [f"{'version':>7}  {'schema s':>9}  {'backfill s':>10}  {'batches':>7}  description"]
+    for entry in report:
+        lines.append(
+            f"{entry['version']:>7}  {entry['schema_seconds']:>9.3f}  "
+            f"{entry['backfill_seconds']:>10.3f}  {entry['batches']:>7}  {entry['description']}")
+    return "\n".join(lines)
+
+
+__all__ = [
+    'load_migrations', 'current_version', 'pending_migrations', 'migrate', 'run_backfills',
+    'backfill_batch', 'dry_run', 'format_report'
+]
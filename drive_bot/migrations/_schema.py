@@ -0,0 +1,68 @@
+# drive_bot/migrations/_schema.py
+"""Schema pieces that more than one migration creates"""
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def column_names(cursor, table: str) -> set:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def create_title_search(cursor, rebuild: bool = True):
+    """Trigram full-text index over titles, kept in sync by triggers.
+
+    ``rebuild=False`` keeps the existing index, for a table rebuilt with
+    the same ids and titles.
+    """
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_title_nocase
+        ON images(title COLLATE NOCASE)
+    ''')
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+                title,
+                content='images',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # Needs SQLite 3.34+ built with FTS5; search falls back to LIKE
+        logger.warning(f"Full-text index unavailable: {e}")
+        return
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+            INSERT INTO images_fts(rowid, title) VALUES (new.id, new.title);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+            INSERT INTO images_fts(images_fts, rowid, title)
+            VALUES ('delete', old.id, old.title);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE OF title ON images BEGIN
+            INSERT INTO images_fts(images_fts, rowid, title)
+            VALUES ('delete', old.id, old.title);
+            INSERT INTO images_fts(rowid, title) VALUES (new.id, new.title);
+        END
+    ''')
+    if rebuild:
+        cursor.execute("INSERT INTO images_fts(images_fts) VALUES ('rebuild')")
+
+
+def create_active_recent_index(cursor):
+    """Covering index for keyset pagination over active images.
+
+    is_active is repeated in the key so the partial index stays covering.
+    """
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_images_active_recent
+        ON images(upload_time, id, title, is_active)
+        WHERE is_active = 1
+    ''')
@@ -0,0 +1,198 @@
+# drive_bot/ratelimit.py
+"""Token-bucket rate limiting for the Drive and Telegram APIs.
+
+Each budget is a TokenBucket: calls take a token, and when none is left
+they queue (in arrival order) until one refills instead of hitting the API
+and collecting 403/429 errors. A bucket's queue is bounded; past that the
+call is refused with RateLimitBusy so callers push back rather than pile
+up. When an API answers with Retry-After anyway, the bucket is paused for
+that long so every queued call waits, not just the one that failed.
+"""
+import os
+import time
+import asyncio
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from drive_bot.metrics import rate_limit_rejected, rate_limit_retries, rate_limit_waiting
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Drive allows bursts but throttles sustained writes well below reads
+DRIVE_READ_RATE = float(os.environ.get('DRIVE_READ_RATE', 20))
+DRIVE_WRITE_RATE = float(os.environ.get('DRIVE_WRITE_RATE', 5))
+DRIVE_QUEUE_LIMIT = int(os.environ.get('DRIVE_QUEUE_LIMIT', 500))
+
+# Bot API limits: about 30 messages per second overall, one per second in a
+# private chat and 20 per minute in a group
+TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', 1))
+TELEGRAM_GROUP_RATE = float(os.environ.get('TELEGRAM_GROUP_RATE', 20 / 60))
+TELEGRAM_QUEUE_LIMIT = int(os.environ.get('TELEGRAM_QUEUE_LIMIT', 20))
+TELEGRAM_MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', 2))
+
+# Per-chat buckets are dropped once this many exist and they are idle
+MAX_CHAT_BUCKETS = 1024
+
+
+class RateLimitBusy(Exception):
+    """A rate limiter's queue is full; try again after ``retry_after`` seconds"""
+
+    def __init__(self, limiter: str, retry_after: float):
+        super().__init__(f"{limiter} rate limit queue is full, retry in {retry_after:.0f}s")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``burst``.
+
+    Tokens are reserved on arrival, so the balance may go negative: a
+    caller's wait is how long the refill takes to cover its reservation,
+    which serves queued calls in order without waking them all to race.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None,
+                 max_waiting: int = 0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_waiting = max_waiting
+        self.tokens = self.burst
+        self.waiting = 0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds a call asking for ``tokens`` now would wait"""
+        now = time.monotonic()
+        self._refill(now)
+        shortfall = max(0.0, tokens - self.tokens) / self.rate
+        return max(shortfall, self._paused_until - now)
+
+    async def acquire(self, tokens: float = 1):
+        wait = self.delay(tokens)
+        if wait > 0 and self.max_waiting and self.waiting >= self.max_waiting:
+            rate_limit_rejected.inc(limiter=self.name)
+            raise RateLimitBusy(self.name, wait)
+        self.tokens -= tokens
+        if wait <= 0:
+            return
+        self.waiting += 1
+        rate_limit_waiting.inc(limiter=self.name)
+        try:
+            await asyncio.sleep(wait)
+            # A pause may have started while this call was queued
+            while self._paused_until > time.monotonic():
+                await asyncio.sleep(self._paused_until - time.monotonic())
+        finally:
+            self.waiting -= 1
+            rate_limit_waiting.dec(limiter=self.name)
+
+    def pause(self, seconds: float):
+        """Hold every call for ``seconds``, e.g. after a Retry-After answer"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return not self.waiting and self.tokens >= self.burst and self._paused_until <= now
+
+
+drive_reads = TokenBucket('drive_read', DRIVE_READ_RATE, DRIVE_READ_RATE * 2,
+                          DRIVE_QUEUE_LIMIT)
+drive_writes = TokenBucket('drive_write', DRIVE_WRITE_RATE, DRIVE_WRITE_RATE * 2,
+                           DRIVE_QUEUE_LIMIT)
+
+
+def split_drive_budget(parts: int):
+    """Give this process its share of the Drive budget when ``parts`` share it"""
+    for bucket in (drive_reads, drive_writes):
+        bucket.rate /= parts
+        bucket.burst = bucket.tokens = max(1.0, bucket.burst / parts)
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """Throttles Bot API calls globally and per chat, and retries flood waits.
+
+    Calls addressed to a chat take a token from that chat's bucket as well
+    as the global one; inline and callback answers only need the global
+    one. ``rate_limit_args`` overrides the number of RetryAfter retries.
+    """
+
+    def __init__(self, max_retries: int = TELEGRAM_MAX_RETRIES,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE):
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket('telegram_global', global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._prune()
+            # Negative ids and @usernames are groups and channels
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = self._chats[chat_id] = TokenBucket(
+                'telegram_chat', TELEGRAM_GROUP_RATE if group else TELEGRAM_CHAT_RATE,
+                burst=3, max_waiting=TELEGRAM_QUEUE_LIMIT)
+        return bucket
+
+    def _prune(self):
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle]:
+            del self._chats[chat_id]
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict, List[Dict]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict, List[Dict]]:
+        max_retries = rate_limit_args if rate_limit_args is not None else self.max_retries
+        chat_id = data.get('chat_id')
+        if isinstance(chat_id, str):
+            try:
+                chat_id = int(chat_id)
+            except ValueError:
+                pass
+        chat = self._chat_bucket(chat_id) if chat_id is not None else None
+
+        attempt = 0
+        while True:
+            if chat is not None:
+                try:
+                    await chat.acquire()
+                except RateLimitBusy as e:
+                    # A TelegramError, which callers already handle per call
+                    raise RetryAfter(int(e.retry_after) + 1) from e
+            await self.global_bucket.acquire()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                rate_limit_retries.inc(api='telegram')
+                logger.warning(f"Telegram flood wait on {endpoint}, retrying in {e.retry_after}s")
+                (chat or self.global_bucket).pause(e.retry_after)
+
+
+__all__ = [
+    'RateLimitBusy', 'TokenBucket', 'TelegramRateLimiter', 'drive_reads', 'drive_writes',
+    'split_drive_budget'
+]
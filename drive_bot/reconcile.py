@@ -0,0 +1,160 @@
+# drive_bot/reconcile.py
+"""Keeps the images table in step with what happens to files in Drive.
+
+Rather than scanning the folder, the reconciler follows Drive's changes
+feed: the page token it has read up to is kept in the metadata table, and
+each poll fetches only the changes since then. Every page is applied in
+one transaction together with the next token, so a crash never skips or
+replays part of a page.
+
+Uploads record the name the bot gave the file in its appProperties, and
+only a name that differs from it counts as a rename in Drive: most
+changes (sharing, for one) leave the name alone.
+"""
+import os
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from drive_bot.cache import invalidate_images
+from drive_bot.database import apply_drive_changes, get_metadata, set_metadata
+from drive_bot.drive_service import execute, get_drive_service
+from drive_bot.utils import is_valid_title
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = float(os.environ.get('RECONCILE_INTERVAL', 300))
+CHANGES_PAGE_SIZE = 1000
+CHANGES_TOKEN_KEY = 'drive_changes_token'
+
+# A property's key and value share a 124 byte limit that a long title can
+# exceed, so the name is recorded as its MD5
+NAME_PROPERTY = 'godrive_name_md5'
+EXTENSION_PROPERTY = 'godrive_ext'
+
+
+def _name_digest(name: str) -> str:
+    return hashlib.md5(name.encode('utf-8')).hexdigest()
+
+
+def name_properties(title: str, extension: str) -> Dict[str, str]:
+    """appProperties recording the name ``<title><extension>`` of an upload"""
+    properties = {NAME_PROPERTY: _name_digest(f"{title}{extension}")}
+    if extension:
+        properties[EXTENSION_PROPERTY] = extension
+    return properties
+
+
+def renamed_title(file: Dict) -> Optional[str]:
+    """Title for a Drive file renamed since upload; None if it was not.
+
+    Files uploaded before names were recorded are never taken as renamed,
+    and neither are names an upload would refuse as a title.
+    """
+    name = file.get('name')
+    properties = file.get('appProperties') or {}
+    recorded = properties.get(NAME_PROPERTY)
+    if not name or recorded is None or _name_digest(name) == recorded:
+        return None
+    extension = properties.get(EXTENSION_PROPERTY, '')
+    title = name
+    if extension and name.endswith(extension) and len(name) > len(extension):
+        title = name[:-len(extension)]
+    if not is_valid_title(title):
+        logger.warning(f"Ignoring rename in Drive to '{name}': not a valid title")
+        return None
+    return title
+
+
+def parse_change(change: Dict) -> Optional[Tuple[str, str, Optional[str]]]:
+    """(drive_file_id, state, title) of a changes.list entry; None if not a file.
+
+    title is only set for a file renamed in Drive.
+    """
+    file_id = change.get('fileId')
+    if not file_id:
+        # Shared drive metadata changes carry no file
+        return None
+    if change.get('removed'):
+        return file_id, 'removed', None
+    file = change.get('file') or {}
+    if file.get('trashed'):
+        return file_id, 'trashed', None
+    return file_id, 'present', renamed_title(file)
+
+
+class Reconciler:
+    """Polls the Drive changes feed and applies it to the database"""
+
+    def __init__(self, interval: float = RECONCILE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Apply every change since the stored token; returns how many were read"""
+        token = await get_metadata(CHANGES_TOKEN_KEY)
+        if token is None:
+            # First run: start following from now, there is nothing to catch up on
+            response = await execute(
+                get_drive_service().changes().getStartPageToken(supportsAllDrives=True))
+            await set_metadata(CHANGES_TOKEN_KEY, response['startPageToken'])
+            logger.info("Started following the Drive changes feed")
+            return 0
+
+        seen = 0
+        while True:
+            response = await execute(get_drive_service().changes().list(
+                pageToken=token,
+                pageSize=CHANGES_PAGE_SIZE,
+                includeRemoved=True,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+                fields='nextPageToken,newStartPageToken,changes(fileId,removed,file(name,trashed,appProperties))'
+            ))
+            changes = [parsed for parsed in map(parse_change, response.get('changes', []))
+                       if parsed is not None]
+            token = response.get('nextPageToken') or response['newStartPageToken']
+            summary = await apply_drive_changes(changes, CHANGES_TOKEN_KEY, token)
+            if summary is None:
+                raise ConnectionError("Database unavailable while reconciling")
+            seen += len(changes)
+            self._report(summary)
+            if 'nextPageToken' not in response:
+                return seen
+
+    def _report(self, summary: Dict[str, List[str]]):
+        titles = [title for titles in summary.values() for title in titles]
+        if not titles:
+            return
+        invalidate_images(*titles)
+        renamed = summary['renamed']
+        logger.info(
+            f"Reconciled with Drive: {len(summary['purged'])} removed, "
+            f"{len(summary['deactivated'])} trashed, {len(summary['restored'])} restored, "
+            f"{len(renamed) // 2} renamed")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Drive reconciliation failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+reconciler = Reconciler()
+
+__all__ = [
+    'Reconciler', 'reconciler', 'parse_change', 'name_properties', 'renamed_title',
+    'CHANGES_TOKEN_KEY'
+]
@@ -0,0 +1,145 @@
+# drive_bot/transfer.py
+import os
+import uuid
+import hashlib
+from typing import Dict, Optional
+import httpx
+from telegram import Bot
+from googleapiclient.http import MediaFileUpload
+from drive_bot.config import DOWNLOADS_DIR, FOLDER_ID
+from drive_bot.database import find_duplicate
+from drive_bot.drive_service import execute_resumable, get_drive_service
+from drive_bot.reconcile import name_properties
+from drive_bot.utils import ensure_downloads_dir, safe_delete_file
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bounded buffers: one network read and one Drive chunk in memory at a time
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# Bot API servers only hand out files up to this size
+MAX_DOWNLOAD_SIZE = 20 * 1024 * 1024
+
+
+def spool_path(suffix: str = '') -> str:
+    """Unique scratch file in DOWNLOADS_DIR for an in-flight transfer"""
+    ensure_downloads_dir()
+    return os.path.join(DOWNLOADS_DIR, f"{uuid.uuid4().hex}{suffix}")
+
+
+async def download_to_path(bot: Bot, file_id: str, path: str, digest=None) -> int:
+    """Stream a Telegram file to disk chunk by chunk and return its size.
+
+    A hashlib object passed as ``digest`` is fed every chunk on the way.
+    """
+    tg_file = await bot.get_file(file_id)
+    if bot.local_mode:
+        # Local Bot API server: the file is already on disk, just copy it
+        await tg_file.download_to_drive(custom_path=path)
+        if digest is not None:
+            with open(path, 'rb') as copied:
+                for chunk in iter(lambda: copied.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        return os.path.getsize(path)
+
+    size = 0
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
+        async with client.stream('GET', tg_file.file_path) as response:
+            response.raise_for_status()
+            with open(path, 'wb') as out:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    out.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    size += len(chunk)
+    return size
+
+
+def drive_media(path: str, mimetype: str) -> MediaFileUpload:
+    """Resumable Drive upload that reads the spooled file one chunk at a time"""
+    return MediaFileUpload(
+        path,
+        mimetype=mimetype,
+        chunksize=UPLOAD_CHUNK_SIZE,
+        resumable=True
+    )
+
+
+async def upload_to_drive(bot: Bot, media: Dict, title: str, uploader_name: str,
+                          on_progress=None, on_stage=None,
+                          app_properties: Optional[Dict[str, str]] = None) -> Dict:
+    """Stream a Telegram file to Drive through a spool file.
+
+    Returns the created Drive file (id, webViewLink, webContentLink) with the
+    downloaded size added as ``size`` and its MD5 as ``md5``; the file is
+    not shared yet. ``on_stage`` is awaited with 'downloading' and then
+    'uploading'.
+
+    When the same Telegram file or the same bytes are already stored, the
+    existing Drive file is returned instead, with ``duplicate_of`` set to
+    the title that holds it.
+    """
+    # Telegram's file_unique_id is stable per file, so it is checked first
+    existing = await find_duplicate(file_unique_id=media.get('file_unique_id'))
+    if existing:
+        return _reuse(existing)
+
+    path = spool_path(media['extension'])
+    try:
+        if on_stage:
+            await on_stage('downloading')
+        # MD5 matches Drive's md5Checksum, so backfilled hashes compare equal
+        digest = hashlib.md5()
+        file_size = await download_to_path(bot, media['file_id'], path, digest)
+        content_md5 = digest.hexdigest()
+        existing = await find_duplicate(content_md5=content_md5)
+        if existing:
+            return _reuse(existing)
+
+        file_metadata = {
+            'name': f"{title}{media['extension']}",
+            'parents': [FOLDER_ID],
+            'description': f"Uploaded via Telegram by {uploader_name}",
+            'contentHints': {
+                'indexableText': title  # Improves searchability in Drive
+            }
+        }
+        # Lets the reconciler tell a rename in Drive from the name given here
+        file_metadata['appProperties'] = {
+            **name_properties(title, media['extension']), **(app_properties or {})}
+        if on_stage:
+            await on_stage('uploading')
+        uploaded_file = await execute_resumable(
+            get_drive_service().files().create(
+                body=file_metadata,
+                media_body=drive_media(path, media['mime_type']),
+                fields='id,name,webViewLink,webContentLink',
+                supportsAllDrives=True
+            ),
+            on_progress
+        )
+        uploaded_file['size'] = file_size
+        uploaded_file['md5'] = content_md5
+        return uploaded_file
+    finally:
+        await safe_delete_file(path)
+
+
+def _reuse(existing: Dict) -> Dict:
+    logger.info(f"Content already stored as '{existing['title']}', reusing its Drive file")
+    return {
+        'id': existing['drive_file_id'],
+        'webViewLink': existing['share_link'],
+        'webContentLink': existing['direct_link'] or '',
+        'size': existing['file_size'],
+        'md5': existing['content_md5'],
+        'duplicate_of': existing['title'],
+    }
+
+
+__all__ = [
+    'spool_path', 'download_to_path', 'drive_media', 'upload_to_drive',
+    'MAX_DOWNLOAD_SIZE'
+]
@@ -0,0 +1,78 @@
+# drive_bot/upload_queue.py
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 2))
+UPLOAD_QUEUE_SIZE = int(os.environ.get('UPLOAD_QUEUE_SIZE', 20))
+
+
+class UploadQueue:
+    """Bounded queue of upload jobs processed by a fixed pool of workers.
+
+    Handlers submit a job and return immediately, so the update loop keeps
+    serving searches while Drive transfers run in the background.
+    """
+
+    def __init__(self, concurrency: int = UPLOAD_CONCURRENCY,
+                 maxsize: int = UPLOAD_QUEUE_SIZE):
+        self.concurrency = max(1, concurrency)
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.active = 0
+
+    def _ensure_started(self):
+        """Start the workers lazily, once an event loop is running"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker(n))
+                for n in range(self.concurrency)
+            ]
+            logger.info(f"Upload queue started with {self.concurrency} workers")
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def submit(self, job: Callable[[], Awaitable[None]]) -> int:
+        """Queue a job and return its position; raises asyncio.QueueFull"""
+        self._ensure_started()
+        self._queue.put_nowait(job)
+        return self._queue.qsize() + self.active
+
+    async def put(self, job: Callable[[], Awaitable[None]]):
+        """Queue a job, waiting for room instead of failing when full"""
+        self._ensure_started()
+        await self._queue.put(job)
+
+    async def _worker(self, number: int):
+        while True:
+            job = await self._queue.get()
+            self.active += 1
+            try:
+                await job()
+            except Exception:
+                logger.exception(f"Upload worker {number} job failed")
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    async def shutdown(self):
+        """Let queued jobs finish, then stop the workers"""
+        if self._queue is not None:
+            await self._queue.join()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+upload_queue = UploadQueue()
+
+__all__ = ['UploadQueue', 'upload_queue']
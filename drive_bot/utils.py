@@ -1,6 +1,7 @@
 # utils.py
 import os
 import asyncio
+from typing import List
 from drive_bot.config import MAX_RETRIES, DOWNLOADS_DIR
 import logging
 
@@ -8,11 +9,37 @@ logger = logging.getLogger(__name__)
 
 async def safe_delete_file(file_path: str, retries: int = MAX_RETRIES):
     """Safely delete a file with retries"""
-    # ... existing implementation ...
+    for attempt in range(retries):
+        try:
+            os.remove(file_path)
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            if attempt == retries - 1:
+                logger.error(f"Could not delete {file_path}: {e}")
+                return False
+            await asyncio.sleep(0.5 * (attempt + 1))
+    return False
+
+def is_valid_title(title: str) -> bool:
+    """Validate image title format"""
+    if not title or len(title) > 100:
+        return False
+    return all(c.isalnum() or c in ' -_.,' for c in title)
+
+def split_titles(text: str) -> List[str]:
+    """Split a multi-title argument on ';' or newlines (titles may contain commas)"""
+    titles = []
+    for line in text.replace(';', '\n').splitlines():
+        title = line.strip()
+        if title and title not in titles:
+            titles.append(title)
+    return titles
 
 def ensure_downloads_dir():
     """Ensure downloads directory exists"""
     os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
 # Only export utils-specific functions
-__all__ = ['safe_delete_file', 'ensure_downloads_dir']
\ No newline at end of file
+__all__ = ['safe_delete_file', 'is_valid_title', 'split_titles', 'ensure_downloads_dir']
\ No newline at end of file
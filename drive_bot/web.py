@@ -0,0 +1,107 @@
+# drive_bot/web.py
+import os
+from typing import Optional
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+from drive_bot.cache import image_id_cache, inline_cache, list_cache, reply_cache, title_cache
+from drive_bot.handlers.inline_handler import inline_coalescer
+from drive_bot.logger import dropped_records
+from drive_bot.metrics import registry
+from drive_bot.upload_queue import upload_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Port of the web server when the bot polls or runs worker processes; in
+# single-process webhook mode it serves PORT alongside the webhook. 0
+# disables it
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9090))
+METRICS_HOST = os.environ.get('METRICS_HOST', '0.0.0.0')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+cache_entries = registry.gauge('godrive_cache_entries', 'Entries held by each cache', ['cache'])
+cache_lookups = registry.counter(
+    'godrive_cache_lookups_total', 'Cache lookups since start', ['cache', 'result'])
+inline_queries = registry.counter(
+    'godrive_inline_queries_total', 'Inline queries since start by outcome', ['outcome'])
+log_records_dropped = registry.counter(
+    'godrive_log_records_dropped_total', 'Log records dropped because the log queue was full')
+upload_queue_depth = registry.gauge(
+    'godrive_upload_queue_depth', 'Upload jobs waiting or running', ['state'])
+
+_CACHES = {
+    'title': title_cache,
+    'image_id': image_id_cache,
+    'reply': reply_cache,
+    'list': list_cache,
+    'inline': inline_cache,
+}
+
+
+def _collect_app_stats():
+    """Copy counters kept by the caches, coalescer and upload queue"""
+    for name, cache in _CACHES.items():
+        stats = cache.stats()
+        cache_entries.set(stats['size'], cache=name)
+        cache_lookups.set(stats['hits'], cache=name, result='hit')
+        cache_lookups.set(stats['misses'], cache=name, result='miss')
+    for outcome, count in inline_coalescer.stats.items():
+        inline_queries.set(count, outcome=outcome)
+    log_records_dropped.set(dropped_records())
+    upload_queue_depth.set(upload_queue.pending, state='queued')
+    upload_queue_depth.set(upload_queue.active, state='active')
+
+
+registry.add_collector(_collect_app_stats)
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), headers={'Content-Type': CONTENT_TYPE})
+
+
+class WebServer:
+    """Small aiohttp server for endpoints the bot exposes besides Telegram's"""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.app = web.Application()
+        self.app.router.add_get('/metrics', metrics_view)
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_webhook(self, path: str, application: Application, secret: Optional[str] = None):
+        """Feed Telegram's webhook calls on ``path`` to ``application``.
+
+        Must be called before start(). Render exposes a single port, so the
+        webhook shares it with /metrics.
+        """
+        async def handle_update(request: web.Request) -> web.Response:
+            if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+                return web.Response(status=403)
+            try:
+                data = await request.json()
+            except ValueError:
+                return web.Response(status=400)
+            await application.update_queue.put(Update.de_json(data, application.bot))
+            return web.Response()
+        self.app.router.add_post(path, handle_update)
+
+    async def start(self):
+        if not self.port or self._runner is not None:
+            return
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics available on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+web_server = WebServer()
+
+__all__ = ['WebServer', 'web_server', 'metrics_view']
@@ -1,66 +1,84 @@
 import os
+import signal
+import asyncio
 import logging
 from telegram import Update
-from telegram.ext import (
-    ApplicationBuilder,
-    CommandHandler,
-    ContextTypes,
-    MessageHandler,
-    CallbackQueryHandler,
-    filters,
-    InlineQueryHandler
-)
-from drive_bot.handlers.start_handler import start
-from drive_bot.handlers.upload_handler import upload_image
-from drive_bot.handlers.delete_handler import delete_image
-from drive_bot.handlers.text_handler import handle_text
-from drive_bot.handlers.button_handler import button_callback
-from drive_bot.handlers.inline_handler import inline_query
-from drive_bot.config import TELEGRAM_BOT_TOKEN, ADMIN_ID, FOLDER_ID
+from telegram.ext import Application, ApplicationBuilder
+from drive_bot.bot import post_init, post_stop, register_handlers
+from drive_bot.config import TELEGRAM_BOT_TOKEN
 from drive_bot.database import init_db
-import asyncio
-from telegram.ext import Application
+from drive_bot.logger import setup_logging
+from drive_bot.cluster import Cluster, WEBHOOK_SECRET, WORKERS
+from drive_bot.ratelimit import TelegramRateLimiter
+from drive_bot.web import web_server
 
-# Initialize logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+async def run_webhook(app: Application, port: int, webhook_url: str):
+    """Serve Telegram's webhook from the web server until SIGINT/SIGTERM.
+
+    Render exposes only PORT, so the webhook and /metrics share it
+    instead of the webhook getting PTB's own listener.
+    """
+    web_server.host, web_server.port = "0.0.0.0", port
+    web_server.add_webhook(f"/{TELEGRAM_BOT_TOKEN}", app, WEBHOOK_SECRET)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    await app.initialize()
+    try:
+        await post_init(app)
+        await app.start()
+        await app.bot.set_webhook(
+            webhook_url,
+            drop_pending_updates=True,
+            allowed_updates=Update.ALL_TYPES,
+            secret_token=WEBHOOK_SECRET
+        )
+        await stopping.wait()
+        # Stop taking updates before the application stops processing them
+        await web_server.stop()
+        await app.stop()
+        await post_stop(app)
+    finally:
+        await app.shutdown()
+
 def main():
     """Configure and start the bot"""
+    setup_logging()
     try:
         # Initialize database
         init_db()
 
-        app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-
-        # Command handlers
-        app.add_handler(CommandHandler("start", start))
-        app.add_handler(CommandHandler("upload", upload_image))
-        app.add_handler(CommandHandler("delete", delete_image))
-
-        # Message handlers
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-        app.add_handler(CallbackQueryHandler(button_callback))
-        app.add_handler(InlineQueryHandler(inline_query))
-        
-        # Photo handler (for images sent without command)
-        app.add_handler(MessageHandler(
-            filters.PHOTO & ~filters.COMMAND, 
-            lambda u, c: upload_image(u, c) if u.message.from_user.id == ADMIN_ID 
-            else u.message.reply_text("🚫 Only admin can upload images.")
-        ))
-
         # Get port and app URL from environment variables
         port = int(os.environ.get('PORT', 5000))
         app_url = os.environ.get('RENDER_EXTERNAL_URL')
-        
+
+        if app_url and WORKERS > 1:
+            # Webhook front dispatching to worker processes
+            logger.info(f"Starting webhook front on port {port} with {WORKERS} workers...")
+            Cluster(WORKERS, TELEGRAM_BOT_TOKEN, f"{app_url}/{TELEGRAM_BOT_TOKEN}").run(
+                "0.0.0.0", port)
+            return
+        if WORKERS > 1:
+            logger.warning("WORKERS is only used in webhook mode; polling in one process")
+
+        builder = (
+            ApplicationBuilder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .rate_limiter(TelegramRateLimiter())
+            .post_init(post_init)
+            .post_stop(post_stop)
+        )
+        if app_url:
+            # The web server receives the updates
+            builder = builder.updater(None)
+        app = builder.build()
+
+        register_handlers(app)
+
         logger.info(f"Starting bot on port {port}...")
         
         # Run both polling and webhook for Render compatibility
@@ -68,15 +86,7 @@ def main():
             # Webhook mode for Render
             webhook_url = f"{app_url}/{TELEGRAM_BOT_TOKEN}"
             logger.info(f"Setting webhook URL to: {webhook_url}")
-            
-            app.run_webhook(
-                listen="0.0.0.0",
-                port=port,
-                url_path=TELEGRAM_BOT_TOKEN,
-                webhook_url=webhook_url,
-                drop_pending_updates=True,
-                allowed_updates=Update.ALL_TYPES
-            )
+            asyncio.run(run_webhook(app, port, webhook_url))
         else:
             # Polling mode for local development
             logger.info("Running in polling mode")
@@ -0,0 +1,46 @@
+"""Apply database migrations, or time them first on a copy.
+
+    python migrate.py --dry-run           # report on a copy of DB_PATH
+    python migrate.py --dry-run other.db  # report on a copy of other.db
+    python migrate.py                     # apply to DB_PATH
+
+Copies and backfills commit batch by batch with a pause in between, so
+this can run against the database of a bot that is still serving.
+"""
+import argparse
+import sqlite3
+from drive_bot.config import DB_PATH
+from drive_bot.migrations import (
+    BACKFILL_BATCH_SIZE, BACKFILL_PAUSE, current_version, dry_run, format_report,
+    load_migrations, migrate
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', nargs='?', default=DB_PATH)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="apply to a temporary copy and report timings")
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                        help="rows per copy or backfill transaction")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    version = current_version(conn)
+    conn.close()
+    latest = load_migrations()[-1].VERSION
+    print(f"{args.database}: schema version {version}, latest {latest}")
+
+    if args.dry_run:
+        print(format_report(dry_run(args.database, args.batch_size)))
+        return
+    conn = sqlite3.connect(args.database)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        print(format_report(migrate(conn, args.batch_size, BACKFILL_PAUSE)))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()